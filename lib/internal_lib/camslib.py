@@ -24,12 +24,11 @@ from mpl_toolkits.basemap import Basemap
 from PIL import Image
 
 import string
-import requests
 import ipywidgets as widgets
 from IPython.display import display, clear_output
 
-from owslib.wcs import WebCoverageService
-from owslib.wms import WebMapService
+from mundilib import WmsFrameFetcher, get_service, get_session
+from mundilib.instrumentation import span
 
 from ecmwfapi import ECMWFDataServer
 import ecmwfapi
@@ -411,23 +410,25 @@ def download_images(output_filename, output_dir, projection, color_map, image_ti
 
         # create and save a figure for each grib message
         for grb in grbs.select():
-            figure(num=None, figsize=(16, 10))
+            with span("render"):
+                figure(num=None, figsize=(16, 10))
 
-            # create a map
-            map_ = get_basemap(projection, grb)
-            map_.drawcoastlines()
-            map_.drawcountries()
+                # create a map
+                map_ = get_basemap(projection, grb)
+                map_.drawcoastlines()
+                map_.drawcountries()
 
-            x, y = map_(longitudes, latitudes)
-            data = grb.values
+                x, y = map_(longitudes, latitudes)
+                data = grb.values
 
-            # display the data
-            cs = map_.pcolormesh(x, y, data, cmap=plt.get_cmap(color_map), vmin=0, vmax=vmax)
-            map_.colorbar(cs, label=unit)
+                # display the data
+                cs = map_.pcolormesh(x, y, data, cmap=plt.get_cmap(color_map), vmin=0, vmax=vmax)
+                map_.colorbar(cs, label=unit)
 
-            plt.title(str(image_title) + f' / {grb["parameterName"]} / date: {grb["dataDate"]} / hour: {grb["hour"]}',
-                      loc='left')
-            plt.savefig(path.join(output_dir, f'{grb.messagenumber}'))
+                plt.title(str(image_title) +
+                          f' / {grb["parameterName"]} / date: {grb["dataDate"]} / hour: {grb["hour"]}', loc='left')
+            with span("save"):
+                plt.savefig(path.join(output_dir, f'{grb.messagenumber}'))
             plt.close()
             print("\r #Image - " + str(cpt) + "/" + str(np.size(grbs.select())) + " downloaded")
             cpt += 1
@@ -557,7 +558,7 @@ def getServiceUrl(method, model, service, token):
 
 # get your token
 def getToken(username, password):
-    response = requests.get(server_url + "GetAPIKey?username=" + username + "&password=" + password)
+    response = get_session().get(server_url + "GetAPIKey?username=" + username + "&password=" + password)
     return response.text.replace('<', '>').split('>')[2]
 
 # display a map from a grib file
@@ -662,7 +663,7 @@ class cams_wcs():
     def displayMap(method, model, token):
 
         url = getServiceUrl(method, model, 'WCS', token)
-        wcs = WebCoverageService(url, version='2.0.1')
+        wcs = get_service('wcs', url, '2.0.1')
 
         layers_menu = widgets.Dropdown(
             options=list(wcs.contents),
@@ -785,18 +786,17 @@ class cams_wcs():
 class cams_wms():
     
     def getMapImage(wms, layer, bbox, size, time, elevation):
-        #Get the map
-        output = wms.getmap(layers = [layer.name], 
-                         styles = layer.styles, 
-                         srs = layer.crsOptions[0], 
-                         bbox = bbox, 
-                         size = size, 
-                         time = time, 
-                         elevation = elevation,
-                         format = 'image/png')
+        from io import BytesIO
+
+        #Get the map (through the shared HTTP session)
+        params = {'styles': ','.join(layer.styles)}
+        if elevation is not None:
+            params['elevation'] = str(elevation)
+        with WmsFrameFetcher(wms, layer.name, layer.crsOptions[0]) as fetcher:
+            output = fetcher.get_map(bbox, size, time, **params)
 
         #Open the image
-        return(Image.open(output))
+        return(Image.open(BytesIO(output)))
 
     def getLegend(layer):
         from io import BytesIO
@@ -805,7 +805,7 @@ class cams_wms():
         key = list(layer.styles.keys())[0]
 
         #Get the legend
-        resp = requests.get(layer.styles.get(key).get('legend'))
+        resp = get_session().get(layer.styles.get(key).get('legend'))
 
         #Open the image
         return(Image.open(BytesIO(resp.content)))
@@ -840,7 +840,7 @@ class cams_wms():
     def displayMap(method, model, token):
         
         url = getServiceUrl(method, model, 'WMS', token)
-        wms = WebMapService(url, version='1.3.0')
+        wms = get_service('wms', url, '1.3.0')
 
         layers_menu = widgets.Dropdown(
             options=list(wms.contents),
@@ -945,7 +945,7 @@ class cams_download():
         dlurl = dlserver + "&token=" + token + "&grid=0.1&model=" + model + "&package=" + method + "_" +  \
             pollutant + "_" + leveltype + "&time=" + time +"&referencetime=" + date + "T00:00:00Z&format=GRIB2"
 
-        resp = requests.get(dlurl)
+        resp = get_session().get(dlurl)
         
         data_name = model + '_' + method + '_' + pollutant + '_' + date + '_' + time + '_level_' + str(level)
 
@@ -8,14 +8,14 @@ import imageio
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-import urllib
+from io import BytesIO
 
 import ipywidgets as widgets
-import xml.etree.ElementTree as ET
 from IPython.display import clear_output, display, HTML
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
-from mundilib import MundiCatalogue
+from mundilib import MundiCatalogue, WmsFrameFetcher, get_session
+from mundilib.instrumentation import span
 from utils import city_polygon_bbox
 
 # --------------------------
@@ -75,38 +75,9 @@ def get_image(bbox, height, width, wms_layers, time, satellite, collection, maxC
     img:
         Link to the image to download/open
     """
-    c = MundiCatalogue()
-    wms = c.get_collection(satellite).mundi_wms(collection)
-
-    projection = 'EPSG:4326'
-
-    layers = list(wms.contents)
-
-    for layer in layers:
-        if wms_layers == layer:
-            index_layer = layers.index(layer)
-
-    if maxCC is not None:
-        img = wms.getmap(layers=[wms[layers[index_layer]].name],
-                         srs=projection,
-                         bbox=bbox,
-                         size=(width, height),
-                         format='image/png',
-                         time=time,
-                         showlogo=False,
-                         transparent=False,
-                         maxCC=maxCC,
-                         )
-    else:
-        img = wms.getmap(layers=[wms[layers[index_layer]].name],
-                         srs=projection,
-                         bbox=bbox,
-                         size=(width, height),
-                         format='image/png',
-                         time=time,
-                         showlogo=False,
-                         transparent=False,
-                         )
+    wms = MundiCatalogue().get_collection(satellite).mundi_wms(collection)
+    with WmsFrameFetcher(wms, wms_layers) as fetcher:
+        img = BytesIO(fetcher.get_map(bbox, (width, height), time, showlogo=False, **_vendor_params(maxCC)))
     return img
 
 
@@ -135,33 +106,14 @@ def get_date(bbox, height, width, wms_layers, time, satellite, collection):
     date:
         Acquisition date of the image downloaded
     """
-    date = 'YYYY-MM-DD'
-    c = MundiCatalogue()
-    wms = c.get_collection(satellite).mundi_wms(collection)
+    wms = MundiCatalogue().get_collection(satellite).mundi_wms(collection)
+    with WmsFrameFetcher(wms, wms_layers) as fetcher:
+        return fetcher.get_date(bbox, (width, height), time, showlogo=False)
 
-    projection = 'EPSG:4326'
 
-    layers = list(wms.contents)
-
-    for layer in layers:
-        if wms_layers == layer:
-            index_layer = layers.index(layer)
-
-    response = wms.getfeatureinfo(layers=[wms[layers[index_layer]].name],
-                                  srs=projection,
-                                  bbox=bbox,
-                                  size=(width, height),
-                                  info_format='text/xml',
-                                  time=time,
-                                  showlogo=False,
-                                  xy=(width // 2, height // 2)
-                                  )
-
-    root = ET.fromstring(response.read())
-    for child in root:
-        date = child.attrib['date']
-
-    return date
+def _vendor_params(maxCC=None):
+    # maximum cloud coverage is only sent if it is set
+    return {'maxCC': maxCC} if maxCC is not None else {}
 
 
 def add_logo(image, logo_white, border=True):
@@ -242,60 +194,66 @@ def download_images(bbox, collection, layer, start_date, stop_date,
     satellite, collection = collection
     current_date = start_date
 
+    wms = MundiCatalogue().get_collection(satellite).mundi_wms(collection)
+
     # Importing Mundi_logo
-    logo_white = Image.open(urllib.request.urlopen(URL_LOGO_WHITE))
+    logo_white = Image.open(BytesIO(get_session().get(URL_LOGO_WHITE).content))
     logo_white.mode = 'RGBA'
 
     clear_output(wait=True)
     k = str(int((stop_date - current_date).days / delta_days))
     cpt = 0
     images = []
-    while current_date < stop_date:
-        next_date = current_date + datetime.timedelta(delta_days, 0)
-        time = current_date.strftime("%Y-%m-%d") + '/' + next_date.strftime("%Y-%m-%d")
-        print("\r Image #" + str(cpt) + "/" + k + " : " + time)
-        if maxCC is not None:
-            img = get_image(bbox, height, width, layer, time, satellite, collection, maxCC)
-        else:
-            img = get_image(bbox, height, width, layer, time, satellite, collection)
-        image = Image.open(img)
-        image = image.convert('RGB')
-        # Choosing fonts for the date, title and subtitle
-        # The characters are written in white with a black thin border
-        border = 1
-        fnt = ImageFont.truetype(TTF_PATH, int(width / 45))
-        fnt2 = ImageFont.truetype(TTF_PATH, int(width / 30))
-        fnt3 = ImageFont.truetype(TTF_PATH, int(width / 55))
-        draw = ImageDraw.Draw(image)
-        date = get_date(bbox, height, width, layer, time, satellite, collection)
-        # Drawing the texts on the image
-        # The date
-        draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
-        # The title
-        draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
-        # The subtitle
-        draw.text((0.05 * width - border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width + border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width - border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width + border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width, 0.93 * height), subtitle, (255, 255, 255), fnt3)
-        # Adding the logo
-        add_logo(image, logo_white)
-
-        images.append(np.array(image))
-        filename = str(cpt) + '.png'
-        image.save(SAVE_FOLDER_IMAGES + filename)
-        current_date = next_date
-        cpt += 1
-        clear_output(wait=True)
+    # the layer is resolved once, for all frames
+    with WmsFrameFetcher(wms, layer) as fetcher:
+        while current_date < stop_date:
+            next_date = current_date + datetime.timedelta(delta_days, 0)
+            time = current_date.strftime("%Y-%m-%d") + '/' + next_date.strftime("%Y-%m-%d")
+            print("\r Image #" + str(cpt) + "/" + k + " : " + time)
+            # image and acquisition date are requested concurrently
+            with span("fetch"):
+                frame = fetcher.fetch(bbox, (width, height), time, showlogo=False, **_vendor_params(maxCC))
+            with span("decode"):
+                image = Image.open(BytesIO(frame.image))
+                image = image.convert('RGB')
+            # Choosing fonts for the date, title and subtitle
+            # The characters are written in white with a black thin border
+            border = 1
+            fnt = ImageFont.truetype(TTF_PATH, int(width / 45))
+            fnt2 = ImageFont.truetype(TTF_PATH, int(width / 30))
+            fnt3 = ImageFont.truetype(TTF_PATH, int(width / 55))
+            draw = ImageDraw.Draw(image)
+            date = frame.date
+            # Drawing the texts on the image
+            with span("annotate"):
+                # The date
+                draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
+                # The title
+                draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
+                # The subtitle
+                draw.text((0.05 * width - border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width + border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width - border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width + border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width, 0.93 * height), subtitle, (255, 255, 255), fnt3)
+                # Adding the logo
+                add_logo(image, logo_white)
+
+            images.append(np.array(image))
+            filename = str(cpt) + '.png'
+            with span("save"):
+                image.save(SAVE_FOLDER_IMAGES + filename)
+            current_date = next_date
+            cpt += 1
+            clear_output(wait=True)
     print("All img downloaded on time !")
 
 
@@ -351,7 +309,7 @@ def generate_gif_from_folder(duration, output_name, end_gif_duration, folder=SAV
     # download Mundi logo
     logo_img = None
     if logo_url is not None:
-        logo_img = Image.open(urllib.request.urlopen(logo_url))
+        logo_img = Image.open(BytesIO(get_session().get(logo_url).content))
         logo_img.mode = 'RGBA'
 
     k = len(final_filenames)
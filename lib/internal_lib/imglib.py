@@ -6,11 +6,11 @@ import datetime
 import ipywidgets as widgets
 import matplotlib.pyplot as plt
 import os
-import urllib
-import xml.etree.ElementTree as ET
+from io import BytesIO
  
 from IPython.display import clear_output, HTML, display
-from mundilib import MundiCatalogue
+from mundilib import MundiCatalogue, WmsFrameFetcher, get_session
+from mundilib.instrumentation import span
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from utils import city_polygon_bbox
 
@@ -73,26 +73,9 @@ def get_image(bbox, height, width, wms_layers, time, satellite, collection):
     img:
         Link to the image to download/open
     """
-    c = MundiCatalogue()
-    wms = c.get_collection(satellite).mundi_wms(collection)
-     
-    projection = 'EPSG:4326'
-
-    layers = list(wms.contents)
-    
-    for layer in layers:
-        if wms_layers == layer:
-            index_layer = layers.index(layer)
-
-    img = wms.getmap(layers=[wms[layers[index_layer]].name],
-                     srs=projection,
-                     bbox=bbox,
-                     size=(width, height),
-                     format='image/png',
-                     time=time,
-                     showlogo=False,
-                     transparent=False,
-                     )
+    wms = MundiCatalogue().get_collection(satellite).mundi_wms(collection)
+    with WmsFrameFetcher(wms, wms_layers) as fetcher:
+        img = BytesIO(fetcher.get_map(bbox, (width, height), time, showlogo=False))
     return img
 
 
@@ -121,33 +104,9 @@ def get_date(bbox, height, width, wms_layers, time, sattellite, collection):
     date:
         Acquisition date of the image downloaded
     """
-    date = 'YYYY-MM-DD'
-    c = MundiCatalogue()
-    wms = c.get_collection(sattellite).mundi_wms(collection)
-
-    projection = 'EPSG:4326'
-
-    layers = list(wms.contents)
-    
-    for layer in layers:
-        if wms_layers == layer:
-            index_layer = layers.index(layer)
-
-    response = wms.getfeatureinfo(layers=[wms[layers[index_layer]].name],
-                                  srs=projection,
-                                  bbox=bbox,
-                                  size=(width, height),
-                                  info_format='text/xml',
-                                  time=time,
-                                  showlogo=False,
-                                  xy=(width // 2, height // 2)
-                                  )
-
-    root = ET.fromstring(response.read())
-    for child in root:
-        date = child.attrib['date']
-
-    return date
+    wms = MundiCatalogue().get_collection(sattellite).mundi_wms(collection)
+    with WmsFrameFetcher(wms, wms_layers) as fetcher:
+        return fetcher.get_date(bbox, (width, height), time, showlogo=False)
 
 
 def add_logo(image, logo_white):
@@ -221,14 +180,18 @@ def download_images(bbox, collection, layer, start_date, stop_date,
 
     # Importing Mundi_logo
     logo_white = Image.open(
-        urllib.request.urlopen('https://mundiwebservices.com/build/assets/Mundi-Logo-CMYK-white.png'))
+        BytesIO(get_session().get('https://mundiwebservices.com/build/assets/Mundi-Logo-CMYK-white.png').content))
     logo_white.mode = ('RGBA')
 
     clear_output(wait=True)
     time = start_date.strftime("%Y-%m-%d") + '/' + stop_date.strftime("%Y-%m-%d")
-    img = get_image(bbox, height, width, layer, time, sattellite, collection)
-    image = Image.open(img)
-    image = image.convert('RGB')
+    # image and acquisition date are requested concurrently
+    wms = MundiCatalogue().get_collection(sattellite).mundi_wms(collection)
+    with span("fetch"), WmsFrameFetcher(wms, layer) as fetcher:
+        frame = fetcher.fetch(bbox, (width, height), time, showlogo=False)
+    with span("decode"):
+        image = Image.open(BytesIO(frame.image))
+        image = image.convert('RGB')
 
     # Choosing fonts for the date, title and subtitle
     # The characters are written in white with a black thin border
@@ -237,25 +200,27 @@ def download_images(bbox, collection, layer, start_date, stop_date,
     fnt2 = ImageFont.truetype(TTF_PATH, int(width / 30))
     fnt3 = ImageFont.truetype(TTF_PATH, int(width / 55))
     draw = ImageDraw.Draw(image)
-    date = get_date(bbox, height, width, layer, time, sattellite, collection)
+    date = frame.date
     # Drawing the texts on the image
-    # The date
-    draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
-    draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
-    draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
-    draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
-    draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
-    # The title
-    draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-    draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-    draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-    draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-    draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
-    # Adding the logo
-    add_logo(image, logo_white)
+    with span("annotate"):
+        # The date
+        draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
+        draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
+        draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
+        draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
+        draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
+        # The title
+        draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+        draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+        draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+        draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+        draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
+        # Adding the logo
+        add_logo(image, logo_white)
 
     filename = file_name + '.png'
-    image.save(SAVE_FOLDER_IMAGES + filename)
+    with span("save"):
+        image.save(SAVE_FOLDER_IMAGES + filename)
 
     clear_output(wait=True)
     print("Your image has been successfully downloaded and saved in the sentinel2_images folder !")
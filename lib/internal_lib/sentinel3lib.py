@@ -8,11 +8,12 @@ import imageio
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-import urllib
-import requests
+from io import BytesIO
 
 import ipywidgets as widgets
 from IPython.display import clear_output, display, HTML
+from mundilib import get_session
+from mundilib.instrumentation import span
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
 # --------------------------
@@ -75,7 +76,7 @@ def get_image(bbox, height, width, layers, start_date, stop_date):
     
     url = 'https://creodias.sentinel-hub.com/ogc/wms/891d1d73-cdb0-43ba-a453-b34a6e1dc6e8?SERVICE=WMS&REQUEST=GetMap&TRANSPARENT=true&LAYERS='+layers+'&VERSION=1.1.1&MAXCC=10&FORMAT=image%2Fpng&STYLES=&showLogo=false&time='+str(start_date)+'%2F'+str(stop_date)+'&width='+str(width)+'&height='+str(height)+'&SRS=EPSG%3A4326&bbox='+str(xmin)+'%2C'+str(ymin)+'%2C'+str(xmax)+'%2C'+str(ymax)
     
-    img = requests.get(url)
+    img = get_session().get(url)
     
     return img
 
@@ -158,7 +159,7 @@ def download_images(bbox, layers, start_date, stop_date,
     current_date = start_date
 
     # Importing Mundi_logo
-    logo_white = Image.open(urllib.request.urlopen(URL_LOGO_WHITE))
+    logo_white = Image.open(BytesIO(get_session().get(URL_LOGO_WHITE).content))
     logo_white.mode = 'RGBA'
 
     clear_output(wait=True)
@@ -170,13 +171,15 @@ def download_images(bbox, layers, start_date, stop_date,
         next_date = current_date + datetime.timedelta(delta_days, 0)
         time = current_date.strftime("%Y-%m-%d") + '/' + next_date.strftime("%Y-%m-%d")
         print("\r Image #" + str(cpt) + "/" + k + " : " + time)
-        img = get_image(bbox, height, width, layers, current_date, next_date)
+        with span("getmap"):
+            img = get_image(bbox, height, width, layers, current_date, next_date)
         files = glob.glob(f'{SAVE_FOLDER_IMAGES}*')
         f = open(r'/home/jovyan/work/sentinel3_images/images/'+str(cpt)+'.png', 'wb')
         f.write(img.content)
         f.close()
-        image = Image.open(f'{SAVE_FOLDER_IMAGES}'+str(cpt)+'.png')
-        image = image.convert('RGB')
+        with span("decode"):
+            image = Image.open(f'{SAVE_FOLDER_IMAGES}'+str(cpt)+'.png')
+            image = image.convert('RGB')
         # Choosing fonts for the date, title and subtitle
         # The characters are written in white with a black thin border
         border = 1
@@ -186,23 +189,25 @@ def download_images(bbox, layers, start_date, stop_date,
         draw = ImageDraw.Draw(image)
         date = str(next_date)
         # Drawing the texts on the image
-        # The date
-        draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
-        # The title
-        draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
-        # Adding the logo
-        add_logo(image, logo_white)
+        with span("annotate"):
+            # The date
+            draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
+            draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
+            draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
+            draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
+            draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
+            # The title
+            draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+            draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+            draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+            draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+            draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
+            # Adding the logo
+            add_logo(image, logo_white)
 
         images.append(np.array(image))
-        image.save(SAVE_FOLDER_IMAGES + str(cpt)+'.png')
+        with span("save"):
+            image.save(SAVE_FOLDER_IMAGES + str(cpt)+'.png')
             
         current_date = next_date
         cpt += 1
@@ -535,7 +540,7 @@ def generate_gif_from_folder(duration, output_name, end_gif_duration, folder=SAV
     # download Mundi logo
     logo_img = None
     if logo_url is not None:
-        logo_img = Image.open(urllib.request.urlopen(logo_url))
+        logo_img = Image.open(BytesIO(get_session().get(logo_url).content))
         logo_img.mode = 'RGBA'
 
     k = len(final_filenames)
@@ -1,13 +1,17 @@
 import os 
 
-import geopandas as gpd
+import json
+import logging
 import math
-from descartes import PolygonPatch
-from matplotlib import pyplot as plt
-import osmnx
-import folium
-from IPython.display import display
-from PIL import Image
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, expanduser, join
+
+# geopandas, osmnx, folium, descartes and matplotlib are long to import: they are imported by the functions using them
+
+logger = logging.getLogger(__name__)
 
 os.environ["PROJ_LIB"] = r"c:\Users\a766113\AppData\Local\Continuum\anaconda3\envs\mundi-final\Library\share"
 
@@ -34,41 +38,302 @@ def width2height(bbox, width):
 
 
 # --------------------------
-#  POLYGON/MAP HELPERS
+#  GAZETTEER
 # --------------------------
-def country_polygon_bbox(country_name):
-    """
-    Get the polygon and bbox of a country
+def normalize_name(name):
+    """Normalize a place name, to match names whatever their case, accents and spacing (eg 'Côte  d'Ivoire')"""
+    name = unicodedata.normalize('NFKD', name)
+    return ' '.join(''.join(c for c in name if not unicodedata.combining(c)).casefold().split())
 
-    :param country_name: the English name of a country (eg, 'Switzerland', 'Germany'...)
-    :return: a tuple of a shapely [multi]polygon and a bbox (xmin, ymin, xmax, ymax)
-    """
 
-    # get bbox from a given polygon
-    # function found here: https://www.programcreek.com/python/example/95238/shapely.geometry.box
-    def polygon_box(min_x, min_y, max_x, max_y):
-        f_min_x, f_min_y = int(math.floor(min_x)), int(math.floor(min_y))
-        c_max_x, c_max_y = int(math.ceil(max_x)), int(math.ceil(max_y))
-        offset = (f_min_x, f_min_y)
-        polygon_width = c_max_x - f_min_x
-        polygon_height = c_max_y - f_min_y
-        return offset, polygon_width, polygon_height
+class CountryGazetteer:
+    """
+    Countries of the naturalearth dataset, loaded once (when first used). Countries are found by name (whatever the
+    case, and by usual alternative names or ISO 3166-1 alpha-3 codes), and by location
+    """
 
-    # retrieve all countries
-    world = gpd.read_file(gpd.datasets.get_path('naturalearth_lowres'))
+    # usual names of countries named differently in the dataset, as {alternative name: name in the dataset}
+    ALIASES = {
+        'USA': 'United States of America',
+        'United States': 'United States of America',
+        'UK': 'United Kingdom',
+        'Great Britain': 'United Kingdom',
+        'Russian Federation': 'Russia',
+        'Czech Republic': 'Czechia',
+        'Czech Rep.': 'Czechia',
+        'Democratic Republic of the Congo': 'Dem. Rep. Congo',
+        'Republic of the Congo': 'Congo',
+        'Bosnia and Herzegovina': 'Bosnia and Herz.',
+        'Central African Republic': 'Central African Rep.',
+        'Dominican Republic': 'Dominican Rep.',
+        'Equatorial Guinea': 'Eq. Guinea',
+        'South Sudan': 'S. Sudan',
+        'Solomon Islands': 'Solomon Is.',
+        'Falkland Islands': 'Falkland Is.',
+        'Western Sahara': 'W. Sahara',
+        'Ivory Coast': "Côte d'Ivoire",
+        'Swaziland': 'eSwatini',
+        'Eswatini': 'eSwatini',
+        'Macedonia': 'North Macedonia',
+        'Holland': 'Netherlands',
+    }
+
+    def __init__(self, path=None):
+        """
+        :param path: path of the countries dataset (any format read by geopandas, with 'name' and 'geometry' columns).
+        Defaults to the naturalearth_lowres dataset of geopandas
+        """
+        self.path = path
+        self._world = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        import geopandas as gpd
+        import numpy as np
+        from shapely import STRtree
+
+        world = gpd.read_file(self.path or gpd.datasets.get_path('naturalearth_lowres'))
+        world = world[[c for c in ['name', 'iso_a3', 'geometry'] if c in world.columns]].reset_index(drop=True)
+
+        # row of each country, by normalized name, ISO code and alias
+        index = {}
+        if 'iso_a3' in world.columns:
+            index.update((normalize_name(code), i) for i, code in enumerate(world['iso_a3']) if code and code != '-99')
+        index.update((normalize_name(name), i) for i, name in enumerate(world['name']))
+        index.update((normalize_name(alias), index[normalize_name(name)]) for alias, name in self.ALIASES.items()
+                     if normalize_name(name) in index and normalize_name(alias) not in index)
+
+        bounds = world.geometry.bounds.values
+        self._index = index
+        self._bounds = bounds
+        # bbox of each country, on whole degrees
+        self._bboxes = np.hstack([np.floor(bounds[:, :2]), np.ceil(bounds[:, 2:])]).astype(int)
+        self._tree = STRtree(world.geometry.values)
+        self._world = world
+
+    @property
+    def world(self):
+        """The countries, as a GeoDataFrame ('name', 'iso_a3' and 'geometry' columns)"""
+        if self._world is None:
+            with self._lock:
+                if self._world is None:
+                    self._load()
+        return self._world
+
+    def rows(self, names):
+        """
+        Get the rows of countries
+
+        :param names: the names of countries (or alternative names, or ISO codes)
+        :return: the indices of these countries in the world GeoDataFrame
+        """
+        world = self.world
+        rows = [self._index.get(normalize_name(name)) for name in names]
+        if None in rows:
+            unknown = [name for name, row in zip(names, rows) if row is None]
+            raise ValueError(f"Failed to find countries named {', '.join(map(repr, unknown))} in {len(world)} countries")
+        return rows
+
+    def lookup(self, names):
+        """
+        Get several countries at once
+
+        :param names: the names of countries (or alternative names, or ISO codes)
+        :return: a GeoDataFrame of these countries, in the order of names, with their bounds ('minx', 'miny', 'maxx',
+        'maxy' columns) and their bbox on whole degrees ('bbox' column)
+        """
+        rows = self.rows(names)
+        countries = self.world.iloc[rows].copy()
+        countries[['minx', 'miny', 'maxx', 'maxy']] = self._bounds[rows]
+        countries['bbox'] = [tuple(bbox) for bbox in self._bboxes[rows].tolist()]
+        return countries
+
+    def polygon_bbox(self, name):
+        """
+        Get the polygon and bbox of a country
+
+        :param name: the name of a country (or an alternative name, or an ISO code)
+        :return: a tuple of a shapely [multi]polygon and a bbox on whole degrees (xmin, ymin, xmax, ymax)
+        """
+        row = self.rows([name])[0]
+        return self.world.geometry.values[row], tuple(self._bboxes[row].tolist())
+
+    def reverse(self, points):
+        """
+        Find the countries of locations
+
+        :param points: shapely geometries (eg, Points), or (longitude, latitude) tuples
+        :return: the name of the country of each location (None if it is not in a country)
+        """
+        import shapely
+
+        world = self.world
+        geometries = [p if isinstance(p, shapely.Geometry) else shapely.Point(p) for p in points]
+        names = [None] * len(geometries)
+        for point_index, country_index in self._tree.query(geometries, predicate='intersects').T:
+            if names[point_index] is None:
+                names[point_index] = world['name'].iat[country_index]
+        return names
+
+
+# countries, shared by all functions of this module
+gazetteer = CountryGazetteer()
+
+# on-disk cache of geocoded places, within mundilib cache folder (MUNDILIB_CACHE_DIR environment variable, as in
+# mundilib). The path can be overridden with UTILS_PLACES_CACHE environment variable
+PLACES_CACHE_PATH = os.environ.get('UTILS_PLACES_CACHE', join(
+    os.environ.get('MUNDILIB_CACHE_DIR', join(expanduser('~'), '.cache', 'mundilib')), 'places.json'))
+# time (in seconds) during which a geocoded place is used without being geocoded again
+PLACES_CACHE_TTL = 30 * 24 * 60 * 60
+
+
+class PlaceCache:
+    """
+    Persistent cache of geocoded places (see city_polygon_bbox), keyed by normalized place name. Places are kept in
+    memory and in a JSON file, so that they are geocoded once, not in each process. In offline mode, places are never
+    geocoded: cached places are used whatever their age
+    """
 
-    # only keep geometry and name columns
-    countries = world[['geometry', 'name']]
+    def __init__(self, path=PLACES_CACHE_PATH, ttl=PLACES_CACHE_TTL, offline=False):
+        """
+        :param path: path of the JSON file. If None, places are only cached in memory
+        :param ttl: time (in seconds) during which a place is used without being geocoded again. If None, forever
+        :param offline: if True, places are never geocoded
+        """
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        self._entries = None
+        # shapely polygons of places, parsed when first used
+        self._polygons = {}
+        # reentrant, as entries (which takes the lock when places are first read) is used while the lock is held
+        self._lock = threading.RLock()
+
+    @property
+    def entries(self):
+        """Cached places, as {normalized name: {'polygon': WKT, 'bbox': list, 'place_name': str, 'time': float}}"""
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._read()
+        return self._entries
+
+    def _read(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring places cache {self.path}: {e}")
+            return {}
+
+    def _write(self):
+        # the file is replaced at once, so that it is never read half written
+        if self.path is None:
+            return
+        os.makedirs(dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _is_fresh(self, entry):
+        return self.ttl is None or time.time() - entry['time'] < self.ttl
+
+    def _result(self, key, entry):
+        from shapely import wkt
+
+        polygon = self._polygons.get(key)
+        if polygon is None:
+            polygon = self._polygons[key] = wkt.loads(entry['polygon'])
+        return polygon, tuple(entry['bbox']), entry['place_name']
+
+    def _geocode(self, name):
+        key = normalize_name(name)
+        polygon, bbox, place_name = _geocode_city(name)
+        entry = {'polygon': polygon.wkt, 'bbox': [float(x) for x in bbox], 'place_name': place_name,
+                 'time': time.time()}
+        with self._lock:
+            self.entries[key] = entry
+            self._polygons[key] = polygon
+        return key, entry
+
+    def get(self, name):
+        """
+        Get a place, geocoded only if it is not cached (or too old)
+
+        :param name: the place name (eg 'Toulouse')
+        :return: a tuple of (shapely Polygon, bbox [east, north, west, south], place name [string])
+        """
+        key = normalize_name(name)
+        entry = self.entries.get(key)
+        if entry is not None and (self.offline or self._is_fresh(entry)):
+            return self._result(key, entry)
+        if self.offline:
+            raise LookupError(f"{name!r} is not cached, and can't be geocoded offline")
+
+        try:
+            key, entry = self._geocode(name)
+        except Exception as e:
+            # a stale place is better than none
+            if entry is None:
+                raise
+            logger.warning(f"Failed to geocode {name!r} ({e}): using the place cached on "
+                           f"{time.strftime('%Y-%m-%d', time.localtime(entry['time']))}")
+            return self._result(key, entry)
+        with self._lock:
+            self._write()
+        return self._result(key, entry)
+
+    def prewarm(self, names, max_workers=4):
+        """
+        Geocode places not cached yet (or too old), concurrently, eg the cities of a widget menu
+
+        :param names: the place names
+        :param max_workers: maximum number of places geocoded concurrently
+        :return: the number of places geocoded
+        """
+        missing = {normalize_name(name): name for name in names}
+        missing = [name for key, name in missing.items()
+                   if key not in self.entries or not self._is_fresh(self.entries[key])]
+        if not missing or self.offline:
+            return 0
+
+        def geocode(name):
+            try:
+                return self._geocode(name)
+            except Exception as e:
+                logger.warning(f"Failed to geocode {name!r}: {e}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            nb_geocoded = sum(result is not None for result in executor.map(geocode, missing))
+        with self._lock:
+            self._write()
+        return nb_geocoded
+
+    def clear(self):
+        """Remove all cached places"""
+        with self._lock:
+            self._entries, self._polygons = {}, {}
+            self._write()
+
+
+# geocoded places, shared by all functions of this module
+place_cache = PlaceCache()
 
-    # get our country of interest
-    country = countries[countries['name'] == country_name]
-    polygon = country.geometry.values[0]
 
-    # get polygon coordinates & dimensions
-    (x, y), w, h = polygon_box(*polygon.bounds)
-    bbox = x, y, x + w, y + h
+# --------------------------
+#  POLYGON/MAP HELPERS
+# --------------------------
+def country_polygon_bbox(country_name):
+    """
+    Get the polygon and bbox of a country (see CountryGazetteer)
 
-    return polygon, bbox
+    :param country_name: the English name of a country (eg, 'Switzerland', 'Germany'...)
+    :return: a tuple of a shapely [multi]polygon and a bbox (xmin, ymin, xmax, ymax)
+    """
+    return gazetteer.polygon_bbox(country_name)
 
 
 def display_country_on_world_map(country_name, fig_size=18, color='red'):
@@ -79,18 +344,19 @@ def display_country_on_world_map(country_name, fig_size=18, color='red'):
     :param fig_size: size of the figure. Defaults to 20
     :param color: color to use for the country, as a string. Defaults to 'red'
     """
+    from descartes import PolygonPatch
+    from matplotlib import pyplot as plt
 
     def plot_country_patch(ax):
         # plot a country on the provided axes
-        country = world[world.name == country_name]
-        country_features = country.__geo_interface__['features']
+        polygon, _ = gazetteer.polygon_bbox(country_name)
         country_type_coordinates = {
-            'type': country_features[0]['geometry']['type'],
-            'coordinates': country_features[0]['geometry']['coordinates']
+            'type': polygon.__geo_interface__['type'],
+            'coordinates': polygon.__geo_interface__['coordinates']
         }
         ax.add_patch(PolygonPatch(country_type_coordinates, fc=color, ec="black", alpha=0.85, zorder=2))
 
-    world = gpd.read_file(gpd.datasets.get_path('naturalearth_lowres'))
+    world = gazetteer.world
 
     # plot the whole world
     axe_world = world.plot(figsize=(fig_size, 30), edgecolor=u'gray')
@@ -105,11 +371,19 @@ def display_country_on_world_map(country_name, fig_size=18, color='red'):
 
 def city_polygon_bbox(city_name):
     """
-    Get the polygon, the bounding box and the place name (with region, country, etc) of a city
+    Get the polygon, the bounding box and the place name (with region, country, etc) of a city. Cities are geocoded
+    once, then cached on disk (see PlaceCache)
 
     :param city_name: the city of intereset (eg 'Toulouse')
     :return: a tuple of (shapely Polygon, bbox [east, north, west, south], place name [string])
     """
+    return place_cache.get(city_name)
+
+
+def _geocode_city(city_name):
+    # geocode a city with OpenStreetMap (see city_polygon_bbox)
+    import osmnx
+
     city = osmnx.gdf_from_place(city_name)
 
     # retrieve data from row
@@ -127,7 +401,7 @@ def city_polygon_bbox(city_name):
     return polygon, bbox, place_name
 
 
-def display_wms(polygon, bbox, wms, wms_layers, time, height=512):
+def display_wms(polygon, bbox, wms, wms_layers, time, height=512, max_workers=8):
     """
     Display polygons and their satellite img using WMS and an interactive map. Use only in Jupyter Notebooks.
 
@@ -138,7 +412,15 @@ def display_wms(polygon, bbox, wms, wms_layers, time, height=512):
     '0' (only first layer) or 'all' (all layers)
     :param time: date range for the satellite image formatted as 'YYYY-MM-DD' or 'YYYY-MM-DD/YYYY-MM-DD'
     (eg '2018-12-27/2019-01-10')
+    :param max_workers: maximum number of layers requested (and decoded) concurrently, if wms_layers is 'all'.
+    Defaults to 8
     """
+    import folium
+    from io import BytesIO
+    from IPython.display import display
+    from mundilib import WmsFrameFetcher, ordered_map
+    from PIL import Image
+
     map_center = polygon.centroid
     m = folium.Map([map_center.y, map_center.x], zoom_start=3, tiles='cartodbpositron')
     folium.GeoJson(polygon).add_to(m)
@@ -150,33 +432,24 @@ def display_wms(polygon, bbox, wms, wms_layers, time, height=512):
 
     layers = list(wms.contents)
 
+    def get_map(layer):
+        # GetMap is sent through the shared HTTP session
+        with WmsFrameFetcher(wms, layer, projection) as fetcher:
+            return fetcher.get_map(bbox, (width, height), time, showlogo=False, maxcc=30)
+
+    def get_layer_image(layer):
+        # get and decode the image of a layer (in a worker thread)
+        image = Image.open(BytesIO(get_map(layer)))
+        image.load()
+        return wms[layer].title, image
+
     if wms_layers == '0':
         # get layer from WMS
         print(wms[layers[0]].title)
-        img = wms.getmap(layers=[wms[layers[1]].name],
-                         srs=projection,
-                         bbox=bbox,
-                         size=(width, height),
-                         format='image/png',
-                         time=time,
-                         showlogo=False,
-                         transparent=False,
-                         maxcc=30)
-
-        display(Image.open(img))
+        display(Image.open(BytesIO(get_map(layers[1]))))
 
     elif wms_layers == 'all':
-        # get layers from WMS
-        for lay in layers:
-            print(wms[lay].title)
-            img = wms.getmap(layers=[wms[lay].name],
-                             srs=projection,
-                             bbox=bbox,
-                             size=(width, height),
-                             format='image/png',
-                             time=time,
-                             showlogo=False,
-                             transparent=False,
-                             maxcc=30)
-
-            display(Image.open(img))
+        # get layers from WMS concurrently, and display them in order, as soon as they are received
+        for title, image in ordered_map(get_layer_image, layers, max_workers):
+            print(title)
+            display(image)
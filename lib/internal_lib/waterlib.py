@@ -9,15 +9,14 @@ import ipywidgets as widgets
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-import urllib
 import folium
-import requests
-import xml.etree.ElementTree as ET
 from ast import literal_eval as make_tuple
 from io import BytesIO
 
 from IPython.display import clear_output, HTML, FileLink, FileLinks, display
-from mundilib import MundiCatalogue
+from mundilib import MundiCatalogue, WmsFrameFetcher, get_session
+from mundilib.instrumentation import span
+from owslib.util import ServiceException
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from utils import city_polygon_bbox
 
@@ -51,6 +50,9 @@ SAVE_FOLDER_GIF = f"{SAVE_FOLDER}gif/"
 dates_list = []
 bbox_to_save = []
 
+# GetMap parameters of water images: their resolution is fixed (their size depends on the bbox)
+WATER_MAP_PARAMS = {'transparent': True, 'RESX': '10m', 'RESY': '10m'}
+
 
 class BboxTooLarge(Exception):
     pass
@@ -91,33 +93,16 @@ def get_image(bbox, wms_layers, time):
         Link to the image to download/open
     """
 
-    time_temp = time.split('/')
-    start_date = time_temp[0]
-    stop_date = time_temp[1]
-
-    xmin = bbox[2]
-    ymin = bbox[3]
-    xmax = bbox[0]
-    ymax = bbox[1]
-
-    url = 'http://shservices.mundiwebservices.com/ogc/wms/ea23bfb3-2a67-476f-90e3-fe54873ff897?SERVICE=WMS&REQUEST=GetMap&TRANSPARENT=true&LAYERS=SCL-WATER-ONLY&VERSION=1.1.1&FORMAT=image%2Fpng&STYLES=&showLogo=false&time=' + str(
-        start_date) + '%2F' + str(stop_date) + '&RESX=10m&RESY=10m&SRS=EPSG%3A4326&BBOX=' + str(xmin) + '%2C' + str(
-        ymin) + '%2C' + str(xmax) + '%2C' + str(ymax)
-
-    img = requests.get(url)
-
-    if img.status_code == 400:
-        raise BboxTooLarge()
-
-    black_pixel, total_pixel = pixel_analysis(BytesIO(img.content), (0, 0, 0))
-
-    if black_pixel / total_pixel > 0.95:
-        raise BboxTooLarge()
+    with _water_fetcher(wms_layers) as fetcher:
+        try:
+            content = fetcher.get_map(_water_bbox(bbox), time=time, showlogo=False, **WATER_MAP_PARAMS)
+        except ServiceException:
+            raise BboxTooLarge()
+    _check_water_image(content)
 
     files = glob.glob(f'{SAVE_FOLDER_IMAGES}*')
-    f = open(r'/home/jovyan/work/water_detection/images/' + str(len(files)) + '.png', 'wb')
-    f.write(img.content)
-    f.close()
+    with open(f'{SAVE_FOLDER_IMAGES}{len(files)}.png', 'wb') as f:
+        f.write(content)
 
 
 def get_date(bbox, wms_layers, time, width, height):
@@ -145,33 +130,51 @@ def get_date(bbox, wms_layers, time, width, height):
     date:
         Acquisition date of the image downloaded
     """
-    date = 'YYYY-MM-DD'
-    c = MundiCatalogue()
-    wms = c.get_collection('Sentinel2').mundi_wms('L2A')
+    with _water_fetcher(wms_layers) as fetcher:
+        return fetcher.get_date(_water_bbox(bbox), (width, height), time, showlogo=False)
+
+
+def fetch_water_frame(fetcher, bbox, time):
+    """This function requests a water image and its acquisition date concurrently
+
+    Parameters
+    ----------
+    fetcher: mundilib.WmsFrameFetcher
+        The fetcher of the water layer
+    bbox: numpy.array
+        The BBOX of the area chosen
+    time: string
+        Period of time to select the image
+
+    Returns
+    -------
+    frame: mundilib.WmsFrame
+        The content of the image and its acquisition date
+    """
+    try:
+        frame = fetcher.fetch(_water_bbox(bbox), time=time, map_params=WATER_MAP_PARAMS, showlogo=False)
+    except ServiceException:
+        raise BboxTooLarge()
+    _check_water_image(frame.image)
+    return frame
 
-    projection = 'EPSG:4326'
 
-    layers = list(wms.contents)
+def _water_fetcher(wms_layers):
+    # water images are Sentinel2 L2A images
+    wms = MundiCatalogue().get_collection('Sentinel2').mundi_wms('L2A')
+    return WmsFrameFetcher(wms, wms_layers)
 
-    for layer in layers:
-        if wms_layers == layer:
-            index_layer = layers.index(layer)
 
-    response = wms.getfeatureinfo(layers=[wms[layers[index_layer]].name],
-                                  srs=projection,
-                                  bbox=bbox,
-                                  size=(width, height),
-                                  info_format='text/xml',
-                                  time=time,
-                                  showlogo=False,
-                                  xy=(width // 2, height // 2)
-                                  )
+def _water_bbox(bbox):
+    # city bboxes are (east, north, west, south)
+    return bbox[2], bbox[3], bbox[0], bbox[1]
 
-    root = ET.fromstring(response.read())
-    for child in root:
-        date = child.attrib['date']
 
-    return date
+def _check_water_image(content):
+    # an almost black image means that the bbox is too large
+    black_pixel, total_pixel = pixel_analysis(BytesIO(content), (0, 0, 0))
+    if black_pixel / total_pixel > 0.95:
+        raise BboxTooLarge()
 
 
 def add_logo(image, logo_white, border=True):
@@ -257,7 +260,7 @@ def download_images(bbox, layer, start_date, stop_date,
     current_date = start_date
 
     # Importing Mundi_logo
-    logo_white = Image.open(urllib.request.urlopen(URL_LOGO_WHITE))
+    logo_white = Image.open(BytesIO(get_session().get(URL_LOGO_WHITE).content))
     logo_white.mode = 'RGBA'
 
     clear_output(wait=True)
@@ -265,61 +268,65 @@ def download_images(bbox, layer, start_date, stop_date,
     cpt = 0
     images = []
 
-    while current_date < stop_date:
-
-        next_date = current_date + datetime.timedelta(delta_days, 0)
-        time = current_date.strftime("%Y-%m-%d") + '/' + next_date.strftime("%Y-%m-%d")
-        print("\r Image #" + str(cpt) + "/" + k + " : " + time)
-        try:
-            get_image(bbox, layer, time)
-        except BboxTooLarge:
-            print("The bounding box is too large, please redefine it with www.bboxfinder.com")
-            return
-
-        files = glob.glob(f'{SAVE_FOLDER_IMAGES}*')
-
-        number_image = len(files) - 1
-        image = Image.open('/home/jovyan/work/water_detection/images/' + str(number_image) + '.png')
-        width, height = image.size
-        image = image.convert('RGB')
-        # Choosing fonts for the date, title and subtitle
-        # The characters are written in white with a black thin border
-        border = 1
-        fnt = ImageFont.truetype(TTF_PATH, int(width / 45))
-        fnt2 = ImageFont.truetype(TTF_PATH, int(width / 30))
-        fnt3 = ImageFont.truetype(TTF_PATH, int(width / 55))
-        draw = ImageDraw.Draw(image)
-        date = get_date(bbox, layer, time, width, height)
-        dates_list.append(date)
-
-        # Drawing the texts on the image
-        # The date
-        draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
-        draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
-        # The title
-        draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
-        draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
-        # The subtitle
-        draw.text((0.05 * width - border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width + border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width - border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width + border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
-        draw.text((0.05 * width, 0.93 * height), subtitle, (255, 255, 255), fnt3)
-        # Adding the logo
-        add_logo(image, logo_white)
-
-        images.append(np.array(image))
-        filename = str(cpt) + '.png'
-        image.save(SAVE_FOLDER_IMAGES + filename)
-        current_date = next_date
-        cpt += 1
-        clear_output(wait=True)
+    # the layer is resolved once, for all frames
+    with _water_fetcher(layer) as fetcher:
+        while current_date < stop_date:
+
+            next_date = current_date + datetime.timedelta(delta_days, 0)
+            time = current_date.strftime("%Y-%m-%d") + '/' + next_date.strftime("%Y-%m-%d")
+            print("\r Image #" + str(cpt) + "/" + k + " : " + time)
+            # image and acquisition date are requested concurrently
+            try:
+                with span("fetch"):
+                    frame = fetch_water_frame(fetcher, bbox, time)
+            except BboxTooLarge:
+                print("The bounding box is too large, please redefine it with www.bboxfinder.com")
+                return
+
+            with span("decode"):
+                image = Image.open(BytesIO(frame.image))
+                width, height = image.size
+                image = image.convert('RGB')
+            # Choosing fonts for the date, title and subtitle
+            # The characters are written in white with a black thin border
+            border = 1
+            fnt = ImageFont.truetype(TTF_PATH, int(width / 45))
+            fnt2 = ImageFont.truetype(TTF_PATH, int(width / 30))
+            fnt3 = ImageFont.truetype(TTF_PATH, int(width / 55))
+            draw = ImageDraw.Draw(image)
+            date = frame.date
+            dates_list.append(date)
+
+            # Drawing the texts on the image
+            with span("annotate"):
+                # The date
+                draw.text((0.82 * width - border, 0.10 * height - border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width + border, 0.10 * height - border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width - border, 0.10 * height + border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width + border, 0.10 * height + border), date, (0, 0, 0), fnt)
+                draw.text((0.82 * width, 0.10 * height), date, (255, 255, 255), fnt)
+                # The title
+                draw.text((0.05 * width - border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width + border, 0.85 * height - border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width - border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width + border, 0.85 * height + border), title, (0, 0, 0), fnt2)
+                draw.text((0.05 * width, 0.85 * height), title, (255, 255, 255), fnt2)
+                # The subtitle
+                draw.text((0.05 * width - border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width + border, 0.93 * height - border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width - border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width + border, 0.93 * height + border), subtitle, (0, 0, 0), fnt3)
+                draw.text((0.05 * width, 0.93 * height), subtitle, (255, 255, 255), fnt3)
+                # Adding the logo
+                add_logo(image, logo_white)
+
+            images.append(np.array(image))
+            filename = str(cpt) + '.png'
+            with span("save"):
+                image.save(SAVE_FOLDER_IMAGES + filename)
+            current_date = next_date
+            cpt += 1
+            clear_output(wait=True)
 
     print("All img downloaded on time !")
 
@@ -377,7 +384,7 @@ def generate_gif_from_folder(duration, output_name, end_gif_duration, folder=SAV
     # download Mundi logo
     logo_img = None
     if logo_url is not None:
-        logo_img = Image.open(urllib.request.urlopen(logo_url))
+        logo_img = Image.open(BytesIO(get_session().get(logo_url).content))
         logo_img.mode = 'RGBA'
 
     k = len(final_filenames)
@@ -0,0 +1,2483 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Author : Patricia Segonds
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+
+from __future__ import annotations
+
+# standard library imports
+import hashlib
+import importlib
+import io
+import contextvars
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatch
+from os.path import abspath, basename, dirname, exists, expanduser, join
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Union
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape
+
+# other imports (boto3 and owslib services, long to import, are imported when first used: see LAZY_ATTRIBUTES)
+import requests
+from lxml import etree
+from mundilib.instrumentation import instrument_request, instrument_s3_client, record_cache_hit, request_context, \
+    url_template
+from owslib import fes
+from owslib.crs import Crs
+from owslib.csw import CatalogueServiceWeb, CswRecord, namespaces as csw_namespaces, outputformat, schema_location
+from owslib.util import OrderedDict, ResponseWrapper, ServiceException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+    from owslib.wcs import WebCoverageService
+    from owslib.wfs import WebFeatureService
+    from owslib.wms import WebMapService
+    from owslib.wmts import WebMapTileService
+
+# custom modules imports
+# import utils
+
+
+# Mundi collections ids
+# TODO: addition of other ids (from Landsat, Sentinel3, ...)
+MUNDI_COLLECTION_IDS = {
+    'Sentinel1-GRD': "88b68ca0-1f84-4286-8359-d3f480771de5",
+    'Sentinel2-L1C': "d275ef59-3f26-4466-9a60-ff837e572144",
+    'Sentinel2-L2A': "ea23bfb3-2a67-476f-90e3-fe54873ff897",
+    'Sentinel5P-L2': "9400667f-cb51-4509-8827-44232ccd507f",
+    'Landsat8-L2': "aca4e8e1-7855-4de0-8fe0-096c02859aa8"
+}
+
+# web services endpoints
+MUNDI_SERVICES_ENDPOINTS = {
+    'wms': "http://shservices.mundiwebservices.com/ogc/wms/",
+    'wmts': "http://shservices.mundiwebservices.com/ogc/wmts/",
+    'wfs': "http://shservices.mundiwebservices.com/ogc/wfs/",
+    'wcs': "http://shservices.mundiwebservices.com/ogc/wcs/",
+    'wms_l8': "http://services-uswest2.sentinel-hub.com/ogc/wms/"
+}
+
+# NOTE: above information should be gotten from CSW discovery
+
+# all namespaces used by Mundi
+MUNDI_NAMESPACES = {
+    'atom': "http://www.w3.org/2005/Atom",
+    'csw': "http://www.opengis.net/cat/csw/2.0.2",
+    'dc': "http://purl.org/dc/elements/1.1/",
+    'dct': "http://purl.org/dc/terms/",
+    'DIAS': "http://mundi/DIAS",
+    'eo': "http://a9.com/-/spec/opensearch/extensions/eo/1.0/",
+    'geo': "http://a9.com/-/opensearch/extensions/geo/1.0/",
+    'georss': "http://www.georss.org/georss",
+    'media': "http://search.yahoo.com/mrss/",
+    'os': "http://a9.com/-/spec/opensearch/1.1/",
+    'ows': "http://www.opengis.net/ows",
+    'param': "http://a9.com/-/spec/opensearch/extensions/parameters/1.0/",
+    'referrer': "http://www.opensearch.org/Specifications/OpenSearch/Extensions/Referrer/1.0",
+    'sru': "http://a9.com/-/opensearch/extensions/sru/2.0/",
+    'time': "http://a9.com/-/opensearch/extensions/time/1.0/",
+    'xmlns': "http://www.w3.org/2001/XMLSchema",
+    'xsi': "http://www.w3.org/2001/XMLSchema-instance"
+}
+
+MUNDI_COLLECTIONS = ["Sentinel1", "Sentinel2", "Sentinel3", "Sentinel5p", "Landsat8"]
+
+# object storage endpoint of products
+MUNDI_S3_ENDPOINT = "https://obs.otc.t-systems.com"
+
+# extensions of the raster files which can be read from products
+RASTER_EXTENSIONS = [".jp2", ".tif", ".tiff"]
+
+# on-disk cache of catalogue documents (can be overridden with MUNDILIB_CACHE_DIR environment variable)
+MUNDI_CACHE_DIR = os.environ.get('MUNDILIB_CACHE_DIR', join(expanduser('~'), '.cache', 'mundilib'))
+# time (in seconds) during which a cached document is used without being revalidated
+MUNDI_CACHE_TTL = 24 * 60 * 60
+
+# module attributes imported when first used, as {name: (module, attribute)} (attribute None is the module itself)
+LAZY_ATTRIBUTES = {
+    'boto3': ('boto3', None),
+    'Config': ('botocore.config', 'Config'),
+    'TransferConfig': ('boto3.s3.transfer', 'TransferConfig'),
+    'WebMapService': ('owslib.wms', 'WebMapService'),
+    'WebMapTileService': ('owslib.wmts', 'WebMapTileService'),
+    'WebFeatureService': ('owslib.wfs', 'WebFeatureService'),
+    'WebCoverageService': ('owslib.wcs', 'WebCoverageService')
+}
+
+
+def _import_lazily(name: str):
+    """Get one of LAZY_ATTRIBUTES, importing its module on first use"""
+    module_name, attribute = LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __getattr__(name: str):
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _import_lazily(name)
+
+
+# logger config (the handler is attached once, even if the module is reloaded)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    sh = logging.StreamHandler()
+    sh.setLevel(logging.INFO)
+    sh.setFormatter(logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s'))
+    logger.addHandler(sh)
+
+
+# --------------------------
+#  EXCEPTIONS
+# --------------------------
+class ErrorMessages:
+    UNSUPPORTED_SERVICE = "Unsupported web service version requested."
+    UNAVAILABLE_COLLECTION = "Unavailable collection."
+    UNAVAILABLE_COLLECTION_SERVICE = "Unavailable service on collection."
+
+
+class MundiException(Exception):
+    pass
+
+
+# --------------------------
+# CONCURRENCY
+# --------------------------
+def ordered_map(function, items: Iterable, max_workers: int = 4):
+    """
+    Apply a function to items concurrently, in a bounded thread pool. Results are yielded in the order of the items and
+    only a few calls are run in advance, so that memory stays bounded whatever the number of items
+
+    :param function: the function to apply
+    :param items: the items on which to apply the function
+    :param max_workers: maximum number of concurrent calls
+    :return: an iterator of results
+    """
+    executor = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+    futures = deque()
+    try:
+        for item in items:
+            # calls run in a copy of the caller's context, so that they are recorded within its current span
+            futures.append(executor.submit(contextvars.copy_context().run, function, item))
+            if len(futures) > max_workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        # do not wait for pending calls if the caller stopped iterating
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --------------------------
+# HTTP SESSION
+# --------------------------
+class MundiSession(requests.Session):
+    """
+    HTTP session whose connections are kept alive and pooled (per host), with a default timeout and compressed responses.
+    Idempotent requests are retried on connection errors and on 502, 503 and 504 responses
+    """
+
+    def __init__(self, pool_size: int = 20, timeout: float = 30, retries: int = 3, backoff_factor: float = 0.5):
+        """
+        :param pool_size: maximum number of connections kept alive per host
+        :param timeout: timeout (in seconds) of requests which do not specify one
+        :param retries: maximum number of retries of a request
+        :param backoff_factor: backoff factor between retries (0.5 -> 0.5s, 1s, 2s...)
+        """
+        super().__init__()
+        self.timeout = timeout
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=[502, 503, 504],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        full_url = url
+        if kwargs.get('params'):
+            full_url = requests.Request(method, url, params=kwargs['params']).prepare().url
+
+        with instrument_request(method, full_url) as info:
+            response = super().request(method, url, **kwargs)
+            info.status = response.status_code
+            if kwargs.get('stream'):
+                info.bytes = int(response.headers.get('Content-Length', 0))
+            else:
+                info.bytes = len(response.content)
+            retries = getattr(response.raw, 'retries', None)
+            info.retries = len(retries.history) if retries is not None else 0
+        return response
+
+
+# session shared by all modules (see get_session)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> MundiSession:
+    """
+    Get the HTTP session shared by all modules, so that successive requests reuse connections. It is created with
+    default settings on first use (see configure_session)
+
+    :return: the shared MundiSession instance
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = MundiSession()
+        return _session
+
+
+def configure_session(pool_size: int = 20, timeout: float = 30, retries: int = 3,
+                      backoff_factor: float = 0.5) -> MundiSession:
+    """
+    Replace the HTTP session shared by all modules (see MundiSession for parameters)
+
+    :return: the new shared MundiSession instance
+    """
+    global _session
+    with _session_lock:
+        previous, _session = _session, MundiSession(pool_size, timeout, retries, backoff_factor)
+    if previous is not None:
+        previous.close()
+    return _session
+
+
+def open_url(url_base, data=None, method='Get', cookies=None, username=None, password=None, timeout=30, headers=None,
+             verify=True, cert=None) -> ResponseWrapper:
+    """
+    Same as owslib.util.openURL (OGC service exceptions are raised as ServiceException), through the shared HTTP session
+    """
+    headers = dict(headers) if headers is not None else {}
+    kwargs = {'timeout': timeout, 'verify': verify, 'cert': cert, 'cookies': cookies}
+    if username and password:
+        kwargs['auth'] = (username, password)
+
+    method = method.split('}')[-1].lower()
+    if method == 'post':
+        try:
+            etree.fromstring(data)
+            headers['Content-Type'] = 'text/xml'
+        except (etree.XMLSyntaxError, ValueError):
+            pass
+        kwargs['data'] = data
+    elif method == 'get':
+        kwargs['params'] = data
+    else:
+        raise ValueError(f"Unknown method ('{method}'), expected 'get' or 'post'")
+
+    response = get_session().request(method.upper(), url_base, headers=headers, **kwargs)
+    if response.status_code in [400, 401]:
+        raise ServiceException(response.text)
+    if response.status_code in [404, 500, 502, 503, 504]:
+        response.raise_for_status()
+
+    check_service_exception(response.content, response.headers.get('Content-Type'))
+    return ResponseWrapper(response)
+
+
+def check_service_exception(content: bytes, content_type: str = None):
+    """
+    Raise a ServiceException if a response is an OGC exception report (some services do not set the HTTP status)
+
+    :param content: the content of the response
+    :param content_type: the Content-Type header of the response
+    """
+    if content_type not in ['text/xml', 'application/xml', 'application/vnd.ogc.se_xml']:
+        return
+    root = etree.fromstring(content)
+    for tag in ['{http://www.opengis.net/ows}Exception', '{http://www.opengis.net/ows/1.1}Exception',
+                '{http://www.opengis.net/ogc}ServiceException', 'ServiceException']:
+        exception = root.find(tag)
+        if exception is not None:
+            raise ServiceException('\n'.join(t.strip() for t in exception.itertext() if t.strip()))
+
+
+# --------------------------
+# CACHE
+# --------------------------
+class DocumentCache:
+    """
+    On-disk cache of remote documents. A cached document is used as is while it is younger than "ttl" seconds, it is
+    then revalidated with a conditional request (ETag / Last-Modified)
+    """
+
+    def __init__(self, folder: str = None, ttl: float = None):
+        self.folder = folder if folder is not None else MUNDI_CACHE_DIR
+        self.ttl = ttl if ttl is not None else MUNDI_CACHE_TTL
+
+    def _paths(self, url: str):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return join(self.folder, f'{name}.doc'), join(self.folder, f'{name}.json')
+
+    @staticmethod
+    def _write(path: str, content: bytes):
+        # write in a temporary file first so that concurrent readers never see a partial document
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _store(self, url: str, content: bytes, metadata: Dict[str, Any]):
+        content_path, metadata_path = self._paths(url)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            self._write(content_path, content)
+            self._write(metadata_path, json.dumps(metadata).encode('utf-8'))
+        except OSError as e:
+            # a read-only or full disk must not prevent from using the document
+            logger.debug(f"Failed to cache {url}: {e}")
+
+    def get(self, url: str, timeout: float = 30) -> bytes:
+        """
+        Get a document, from the cache if it is still fresh, from the network otherwise
+
+        :param url: URL of the document
+        :param timeout: timeout (in seconds) of the HTTP request
+        :return: the content of the document
+        """
+        content_path, metadata_path = self._paths(url)
+        try:
+            with open(metadata_path, 'rb') as f:
+                metadata = json.loads(f.read())
+            with open(content_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            metadata, content = None, None
+
+        if metadata is not None and time.time() - metadata['fetched'] < self.ttl:
+            record_cache_hit(url)
+            return content
+
+        # revalidate the cached document (or get it for the first time)
+        headers = {}
+        if metadata is not None:
+            if metadata.get('etag'):
+                headers['If-None-Match'] = metadata['etag']
+            if metadata.get('last_modified'):
+                headers['If-Modified-Since'] = metadata['last_modified']
+
+        try:
+            with request_context(cache='miss' if content is None else 'revalidated'):
+                response = get_session().get(url, headers=headers, timeout=timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if content is None:
+                raise
+            logger.warning(f"Failed to revalidate {url}, using cached document ({e})")
+            return content
+
+        if response.status_code == 304 and content is not None:
+            metadata['fetched'] = time.time()
+        else:
+            content = response.content
+            metadata = {'url': url, 'fetched': time.time(), 'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')}
+        self._store(url, content, metadata)
+        return content
+
+    def clear(self):
+        """Remove all documents from this cache"""
+        if not exists(self.folder):
+            return
+        for filename in os.listdir(self.folder):
+            if filename.endswith(('.doc', '.json')):
+                os.remove(join(self.folder, filename))
+
+
+# default cache, shared by all catalogue objects
+document_cache = DocumentCache()
+
+
+# --------------------------
+# WEB SERVICES
+# --------------------------
+# owslib class name (see LAZY_ATTRIBUTES) and GetCapabilities "service" parameter of each supported web service
+SERVICE_CLASSES = {
+    'wms': ('WebMapService', 'WMS'),
+    'wmts': ('WebMapTileService', 'WMTS'),
+    'wfs': ('WebFeatureService', 'WFS'),
+    'wcs': ('WebCoverageService', 'WCS')
+}
+
+
+class ServiceCache:
+    """
+    Process-wide cache of owslib service instances (WebMapService, WebCoverageService...), keyed by service, endpoint
+    and version. The most recently used instances are kept in memory; if a DocumentCache is provided, capabilities
+    documents are also stored on disk so that a new process does not need to download them again
+    """
+
+    def __init__(self, max_size: int = 32, capabilities_cache: DocumentCache = None):
+        self.max_size = max_size
+        self.capabilities_cache = capabilities_cache
+        self._services = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _create(self, service: str, url: str, version: str):
+        class_name, service_name = SERVICE_CLASSES[service]
+        service_class = _import_lazily(class_name)
+        if self.capabilities_cache is None:
+            return service_class(url, version=version)
+
+        separator = '&' if '?' in url else '?'
+        capabilities_url = f'{url}{separator}service={service_name}&request=GetCapabilities&version={version}'
+        return service_class(url, version=version, xml=self.capabilities_cache.get(capabilities_url))
+
+    def get(self, service: str, url: str, version: str):
+        """
+        Get an owslib service instance, built (ie, GetCapabilities is sent) only if it is not already cached
+
+        :param service: the service type (wms, wmts, wfs or wcs)
+        :param url: the service endpoint
+        :param version: the service version
+        :return: an owslib service instance
+        """
+        key = (service, url, version)
+        with self._lock:
+            if key in self._services:
+                self._services.move_to_end(key)
+                instance = self._services[key]
+            else:
+                instance = None
+        if instance is not None:
+            record_cache_hit(url, url_template('GET', f'{url}?service={SERVICE_CLASSES[service][1]}'
+                                                      f'&request=GetCapabilities'))
+            return instance
+
+        # build the instance outside of the lock, so that different services can be built concurrently
+        instance = self._create(service, url, version)
+
+        with self._lock:
+            self._services[key] = instance
+            self._services.move_to_end(key)
+            while len(self._services) > self.max_size:
+                self._services.popitem(last=False)
+        return instance
+
+    def clear(self):
+        """Remove all service instances from memory (capabilities stored on disk are kept)"""
+        with self._lock:
+            self._services.clear()
+
+
+# default service cache, shared by all collections and helper modules
+service_cache = ServiceCache(capabilities_cache=document_cache)
+
+
+def get_service(service: str, url: str, version: str, cache: bool = True):
+    """
+    Get an owslib service instance for any endpoint (Mundi or not)
+
+    :param service: the service type (wms, wmts, wfs or wcs)
+    :param url: the service endpoint
+    :param version: the service version
+    :param cache: whether to use the process-wide service cache. Defaults to True
+    :return: an owslib service instance
+    """
+    if service not in SERVICE_CLASSES:
+        raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    if cache:
+        return service_cache.get(service, url, version)
+    return _import_lazily(SERVICE_CLASSES[service][0])(url, version=version)
+
+
+class WmsFrame(NamedTuple):
+    # a frame of a WMS layer: its image (content of the GetMap response) and its acquisition date (see WmsFrameFetcher)
+    image: bytes
+    date: str
+
+
+class WmsFrameFetcher:
+    """
+    Fetch frames of a WMS layer, ie its image over a bbox and a time range (GetMap) and the acquisition date of this
+    image (GetFeatureInfo at the center of the bbox). The layer and the operations URLs are resolved once; both requests
+    of a frame are sent concurrently, through the shared HTTP session (see get_session).
+    WMS 1.1.1 and 1.3.0 are supported: bboxes are always given in (x, y) order, ie longitude first for EPSG:4326, and
+    are sent in the axis order of the version and CRS
+    """
+
+    # date of a frame when GetFeatureInfo finds no feature
+    NO_DATE = 'YYYY-MM-DD'
+
+    def __init__(self, wms: WebMapService, layer: str, srs: str = 'EPSG:4326', max_workers: int = 4):
+        """
+        :param wms: an owslib WebMapService instance (see MundiCollection.mundi_wms)
+        :param layer: the name of the layer
+        :param srs: the spatial reference system of bboxes. Defaults to 'EPSG:4326'
+        :param max_workers: maximum number of GetFeatureInfo requests sent concurrently (by different threads)
+        """
+        try:
+            self.layer = wms[layer].name
+        except KeyError:
+            raise MundiException(f"Unknown layer '{layer}' (available layers: {', '.join(wms.contents)})") from None
+        self.version = wms.version
+        if self.version not in ('1.1.1', '1.3.0'):
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+        self.srs = srs
+        self.map_url = self._operation_url(wms, 'GetMap')
+        self.info_url = self._operation_url(wms, 'GetFeatureInfo')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _operation_url(wms: WebMapService, operation: str) -> str:
+        # URL of the Get method of an operation, as advertised by capabilities
+        try:
+            methods = wms.getOperationByName(operation).methods
+        except KeyError:
+            return wms.url
+        return next((m['url'] for m in methods if m.get('type', '').lower() == 'get'), wms.url)
+
+    def _map_params(self, bbox, size, time, format='image/png', transparent=False, **kwargs) -> Dict[str, Any]:
+        if self.version == '1.3.0':
+            # WMS 1.3.0 follows the axis order of the CRS (eg, latitude first for EPSG:4326), as in OWSLib's getmap
+            if Crs(self.srs).axisorder == 'yx':
+                bbox = (bbox[1], bbox[0], bbox[3], bbox[2])
+            crs_name, exceptions = 'crs', 'XML'
+        else:
+            crs_name, exceptions = 'srs', 'application/vnd.ogc.se_xml'
+        params = {'service': 'WMS', 'version': self.version, 'request': 'GetMap', 'layers': self.layer, 'styles': '',
+                  crs_name: self.srs, 'bbox': ','.join(str(x) for x in bbox), 'format': format,
+                  'transparent': str(transparent).upper(), 'bgcolor': '0xFFFFFF', 'exceptions': exceptions}
+        if size is not None:
+            params['width'], params['height'] = str(size[0]), str(size[1])
+        if time is not None:
+            params['time'] = str(time)
+        # vendor parameters (eg, showlogo, maxcc)
+        params.update(kwargs)
+        return params
+
+    def get_map(self, bbox, size=None, time: str = None, **kwargs) -> bytes:
+        """
+        Get the image of a frame
+
+        :param bbox: the bbox (in srs units)
+        :param size: (width, height) of the image, in pixels. If None, the size must be set by vendor parameters (eg,
+        resx and resy)
+        :param time: the time range (eg, '2019-01-01/2019-01-07')
+        :param kwargs: format (defaults to 'image/png'), transparent (defaults to False) and vendor parameters
+        :return: the content of the image
+        """
+        return open_url(self.map_url, self._map_params(bbox, size, time, **kwargs)).read()
+
+    def get_date(self, bbox, size, time: str = None, **kwargs) -> str:
+        """
+        Get the acquisition date of a frame, at the center of its bbox
+
+        :param bbox: the bbox (in srs units)
+        :param size: (width, height) of the image, in pixels
+        :param time: the time range (eg, '2019-01-01/2019-01-07')
+        :param kwargs: vendor parameters
+        :return: the acquisition date (eg, '2019-01-03'), or NO_DATE if no feature is found
+        """
+        params = self._map_params(bbox, size, time, **kwargs)
+        column, row = ('i', 'j') if self.version == '1.3.0' else ('x', 'y')
+        params.update({'request': 'GetFeatureInfo', 'query_layers': self.layer, column: str(size[0] // 2),
+                       row: str(size[1] // 2), 'info_format': 'text/xml', 'feature_count': '20'})
+        date = self.NO_DATE
+        for feature in etree.fromstring(open_url(self.info_url, params).read()):
+            date = feature.get('date', date)
+        return date
+
+    def fetch(self, bbox, size=None, time: str = None, info_size=(512, 512), map_params: Dict[str, Any] = None,
+              **kwargs) -> WmsFrame:
+        """
+        Get the image and the acquisition date of a frame, requested concurrently
+
+        :param bbox: the bbox (in srs units)
+        :param size: (width, height) of the image, in pixels. If None, the size must be set by map_params (eg, resx and
+        resy)
+        :param time: the time range (eg, '2019-01-01/2019-01-07')
+        :param info_size: (width, height) of the GetFeatureInfo request if size is None (only its center is queried)
+        :param map_params: parameters of the GetMap request only
+        :param kwargs: vendor parameters of both requests (eg, showlogo)
+        :return: a WmsFrame
+        """
+        date = self._executor.submit(contextvars.copy_context().run, self.get_date, bbox, size or info_size, time,
+                                     **kwargs)
+        try:
+            image = self.get_map(bbox, size, time, **{**kwargs, **(map_params or {})})
+        except BaseException:
+            date.cancel()
+            raise
+        return WmsFrame(image, date.result())
+
+
+# --------------------------
+# CATALOGUE
+# --------------------------
+class MundiCatalogue:
+    # csw entry point
+    csw_end_point = "https://sentinel2.browse.catalog.mundiwebservices.com/csw"
+
+    def __init__(self):
+        # MundiCollection instances are only built when first requested (see get_collection)
+        self._collections = {}
+
+    @property
+    def collections(self) -> List[MundiCollection]:
+        """
+        Get all supported collections
+
+        :return: a list of MundiCollection, one for each supported platform
+        """
+        return [self.get_collection(p) for p in MUNDI_COLLECTIONS]
+
+    def get_collection(self, name):
+        """
+        Get a collection from this instance's collections list
+
+        :param name: name of the collection
+        :return: the collection as a MundiCollection instance
+        """
+        if name not in MUNDI_COLLECTIONS:
+            raise MundiException(ErrorMessages.UNAVAILABLE_COLLECTION)
+
+        if name not in self._collections:
+            self._collections[name] = MundiCollection(name)
+        return self._collections[name]
+
+    def load_descriptions(self, names: Iterable[str] = None, max_workers: int = 4):
+        """
+        Load concurrently the OpenSearch descriptions of several collections (they are otherwise loaded one by one,
+        when first used)
+
+        :param names: names of the collections. Defaults to all collections having an OpenSearch description
+        :param max_workers: maximum number of concurrent requests
+        """
+        if names is None:
+            names = [p for p in MUNDI_COLLECTIONS if p != "Landsat8"]
+        collections = [self.get_collection(name) for name in names]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # consume results so that exceptions are raised here
+            list(executor.map(lambda c: c.opensearch_description, collections))
+
+    def mundi_csw(self, version="2.0.2"):
+        """
+        Get a MundiCSW instance
+
+        :param version: CSW version. Defaults to 2.0.2
+        :return: a MundiCSW instance
+        """
+        if version in ["2.0.2"]:
+            return MundiCSW(self.csw_end_point, version)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    # ---------------------------------
+    # Functions for retro compatibility
+    # ---------------------------------
+    def get_collections(self):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "collections" property instead')
+        return self.collections
+
+    def getCollections(self):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "collections" property instead')
+        return self.collections
+
+    def getCollection(self, name):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "get_collection" function instead')
+        return self.get_collection(name)
+
+
+# --------------------------
+# CSW
+# --------------------------
+# record elements needed to estimate volumes (see MundiCSW.get_volume_records)
+VOLUME_ELEMENTS = ['DIAS:productDatapackSize', 'DIAS:sensingStartDate', 'DIAS:productType']
+
+
+def get_records_payload(cql_filter: str = None, max_records: int = 50) -> str:
+    """
+    Build a raw GetRecords request asking for full records
+
+    :param cql_filter: a CQL filter, XML escaped (eg, "DIAS:sensingStartDate &gt; '2019-01-01'"). If None, all
+    records are matched
+    :param max_records: maximum number of records per page. Defaults to 50
+    :return: the GetRecords request, as a string
+    """
+    constraint = ''
+    if cql_filter is not None:
+        constraint = f'''<csw:Constraint version='1.1.0'>
+                            <csw:CqlText> {cql_filter}
+                            </csw:CqlText>
+                        </csw:Constraint>'''
+
+    return f'''<GetRecords xmlns='http://www.opengis.net/cat/csw/2.0.2'
+                    xmlns:DIAS='http://mundiwebservices.com/DIAS'
+                    xmlns:csw='http://www.opengis.net/cat/csw/2.0.2'
+                    xmlns:dc='http://purl.org/dc/elements/1.1/'
+                    xmlns:dct='http://purl.org/dc/terms/'
+                    xmlns:gml='http://www.opengis.net/gml'
+                    xmlns:ogc='http://www.opengis.net/ogc'
+                    xmlns:ows='http://www.opengis.net/ows'
+                    xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance'
+                    service='CSW' version='2.0.2' maxRecords='{max_records}' startPosition='1' resultType='results'
+                    outputFormat='application/xml' outputSchema='csw:Record' xsi:schemaLocation='http://www.opengis.net/cat/csw/2.0.2/CSW-discovery.xsd'>
+                    <csw:Query typeNames='csw:Record'>
+                        <csw:ElementSetName>full</csw:ElementSetName>
+                        {constraint}
+                    </csw:Query>
+                </GetRecords>'''
+
+
+def browse_filter(date_from: str = None, date_to: str = None, geometry: str = None,
+                  bbox: Iterable[Union[float, int, str]] = None, other_fields: Dict[str, Any] = None) -> str:
+    """
+    Build the CQL filter of a browse request (see MundiDownloader.browse for parameters)
+
+    :return: the CQL filter, XML escaped
+    """
+    cql_filter = f"DIAS:onlineStatus = ONLINE"
+    if date_from is not None:
+        cql_filter = f"{cql_filter} and DIAS:sensingStartDate &gt; '{date_from}'"
+    if date_to is not None:
+        cql_filter = f"{cql_filter} and DIAS:sensingStartDate &lt; '{date_to}'"
+
+    if bbox is not None:
+        cql_filter = f"{cql_filter} and BBOX(DIAS:footprint,ENVELOPE({', '.join(str(x) for x in bbox)}))"
+    # geometry must be ignored if bbox is specified
+    elif geometry is not None:
+        cql_filter = f"{cql_filter} and INTERSECTS(DIAS:footprint, {geometry})"
+
+    # add any other specified field
+    if other_fields is not None:
+        for field, value in other_fields.items():
+            cql_filter = f"{cql_filter} and {field} = '{value}'"
+    return cql_filter
+
+
+class QueryShard(NamedTuple):
+    # a part of a browse request (see MundiCSW.plan_shards), and the number of records it matches
+    date_from: datetime
+    date_to: datetime
+    bbox: tuple = None
+    nb_records: int = None
+
+    def cql_filter(self, geometry: str = None, other_fields: Dict[str, Any] = None) -> str:
+        return browse_filter(_format_date(self.date_from), _format_date(self.date_to), geometry, self.bbox,
+                             other_fields)
+
+    def split(self, min_duration: timedelta, min_size: float):
+        """
+        Split this shard in two halves: by dates, until they are min_duration long, then by bbox (along its longer
+        side), until its sides are min_size long. Shards overlap by a second, as date bounds are exclusive
+
+        :return: a tuple of 2 shards, or None if this shard can't be split
+        """
+        if self.date_to - self.date_from >= 2 * min_duration:
+            middle = self.date_from + (self.date_to - self.date_from) / 2
+            return (QueryShard(self.date_from, middle + timedelta(seconds=1), self.bbox),
+                    QueryShard(middle, self.date_to, self.bbox))
+        if self.bbox is not None:
+            x_min, y_min, x_max, y_max = (float(x) for x in self.bbox)
+            if max(x_max - x_min, y_max - y_min) >= 2 * min_size:
+                if x_max - x_min >= y_max - y_min:
+                    x_middle = (x_min + x_max) / 2
+                    halves = (x_min, y_min, x_middle, y_max), (x_middle, y_min, x_max, y_max)
+                else:
+                    y_middle = (y_min + y_max) / 2
+                    halves = (x_min, y_min, x_max, y_middle), (x_min, y_middle, x_max, y_max)
+                return tuple(QueryShard(self.date_from, self.date_to, half) for half in halves)
+        return None
+
+
+def _format_date(date: datetime) -> str:
+    return date.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_utc_date(text: Union[str, datetime]) -> datetime:
+    # dates without time zone are UTC
+    date = text if isinstance(text, datetime) else _parse_date(text)
+    return date if date.tzinfo is not None else date.replace(tzinfo=timezone.utc)
+
+
+def project_payload(payload: str, element_names: Iterable[str]) -> str:
+    """
+    Restrict a raw GetRecords request to some record elements (ie, replace its ElementSetName by ElementName elements)
+
+    :param payload: the GetRecords request
+    :param element_names: the qualified names of the elements to get (eg, ["DIAS:productDatapackSize"])
+    :return: the projected GetRecords request, as a string
+    """
+    payload_xml = etree.fromstring(payload)
+    query = payload_xml.find('csw:Query', namespaces=MUNDI_NAMESPACES)
+    for node in query.findall('csw:ElementSetName', namespaces=MUNDI_NAMESPACES) + \
+            query.findall('csw:ElementName', namespaces=MUNDI_NAMESPACES):
+        query.remove(node)
+
+    # ElementName elements must come first in the query
+    for position, name in enumerate(element_names):
+        node = etree.Element(f"{{{MUNDI_NAMESPACES['csw']}}}ElementName")
+        node.text = name
+        query.insert(position, node)
+    return etree.tostring(payload_xml, encoding='unicode')
+
+
+def _sum_volumes(records: Iterable[MundiRecord], breakdown: str = None):
+    # sum records' productDatapackSize, in total and by breakdown key (sensing day or product type)
+    volume, volumes = 0, Counter()
+    for record in records:
+        if record.product_datapack_size is None:
+            continue
+        volume += record.product_datapack_size
+        if breakdown == 'day' and record.sensing_start_date is not None:
+            volumes[record.sensing_start_date.date().isoformat()] += record.product_datapack_size
+        elif breakdown == 'product_type':
+            volumes[record.product_type] += record.product_datapack_size
+    return volume, volumes
+
+
+class MundiCSW(CatalogueServiceWeb):
+
+    def __init__(self, url, version, skip_caps=False):
+        self.records = None
+        # parsed view of self.records, as MundiRecord instances
+        self.mundi_records = None
+        super().__init__(url, version, skip_caps=skip_caps)
+
+    def describe_record(self):
+        """
+        Send a DescribeRecord request and process it. Return metadata as a dict
+
+        :return: as dict of metadata
+        """
+        # getting root node from 'DescribeRecord' request
+        # from https://github.com/geopython/OWSLib/blob/master/owslib/csw.py:
+        # TODO: process the XML Schema (you're on your own for now with self.response)
+        self.describerecord(typename='csw:Record', format='application/xml')
+        root = etree.fromstring(self.response)
+
+        # getting node containing all elements
+        # (i.e. '<complexType name="RecordType" final="#all">')
+        node = root.find('.//csw:SchemaComponent/xmlns:schema/xmlns:complexType[@name="RecordType"]',
+                         namespaces=MUNDI_NAMESPACES)
+        nodes = node.findall('.//*xmlns:element', namespaces=MUNDI_NAMESPACES)
+
+        elements = {}
+        for n in nodes:
+            d = n.find(".//*xmlns:documentation", namespaces=MUNDI_NAMESPACES)
+            if d is not None:
+                elements[n.get('ref')] = d.text.replace("\n", "")
+        return elements
+
+    def _clone(self) -> MundiCSW:
+        # a new instance of this CSW, so that requests can be sent concurrently (capabilities are not requested again)
+        csw = MundiCSW(self.url, self.version, skip_caps=True)
+        # reuse operations URLs read from capabilities
+        if hasattr(self, 'operations'):
+            csw.operations = self.operations
+        return csw
+
+    def _get_records_request(self, constraints=(), sortby=None, typenames='csw:Record', esn='summary',
+                             outputschema=csw_namespaces['csw'], format=outputformat, startposition=0, maxrecords=10,
+                             cql=None, resulttype='results') -> str:
+        """
+        Build a raw GetRecords request from OWSLib's getrecords2 arguments (see getrecords2)
+
+        :return: the GetRecords request, as a string
+        """
+        root = etree.Element(f"{{{csw_namespaces['csw']}}}GetRecords", nsmap=csw_namespaces)
+        root.set('outputSchema', outputschema)
+        root.set('outputFormat', format)
+        root.set('version', self.version)
+        root.set('service', 'CSW')
+        root.set('resultType', resulttype)
+        if startposition > 0:
+            root.set('startPosition', str(startposition))
+        root.set('maxRecords', str(maxrecords))
+        root.set(f"{{{csw_namespaces['xsi']}}}schemaLocation", schema_location)
+
+        query = etree.SubElement(root, f"{{{csw_namespaces['csw']}}}Query", typeNames=typenames)
+        etree.SubElement(query, f"{{{csw_namespaces['csw']}}}ElementSetName").text = esn
+        if constraints or cql is not None:
+            constraint = etree.SubElement(query, f"{{{csw_namespaces['csw']}}}Constraint", version='1.1.0')
+            if constraints:
+                constraint.append(fes.FilterRequest().setConstraintList(constraints))
+            else:
+                etree.SubElement(constraint, f"{{{csw_namespaces['csw']}}}CqlText").text = cql
+        if isinstance(sortby, fes.SortBy):
+            query.append(sortby.toXML())
+        return etree.tostring(root, encoding='unicode')
+
+    def _send_get_records(self, payload: str):
+        """
+        Send a raw GetRecords request through the shared HTTP session (see open_url), and store its results as OWSLib's
+        getrecords2 does: in self.results ('matches', 'returned' and 'nextrecord') and self.records
+        """
+        request = etree.fromstring(payload)
+        esn = request.findtext('csw:Query/csw:ElementSetName', namespaces=MUNDI_NAMESPACES) or 'summary'
+        outputschema = request.get('outputSchema', csw_namespaces['csw'])
+
+        self.request = payload
+        self.response = open_url(self.url, data=payload, method='Post').read()
+        self._exml = etree.parse(io.BytesIO(self.response))
+        search_results = self._exml.find('csw:SearchResults', namespaces=MUNDI_NAMESPACES)
+        if search_results is None:
+            raise ServiceException(f"Unexpected response to GetRecords request from {self.url}")
+
+        next_record = search_results.get('nextRecord')
+        self.results = {'matches': int(search_results.get('numberOfRecordsMatched')),
+                        'returned': int(search_results.get('numberOfRecordsReturned')),
+                        'nextrecord': int(next_record) if next_record is not None else None}
+        self.records = OrderedDict()
+        self._parserecords(outputschema, esn)
+
+    def _get_records_page(self, payload, start_position, nb_records):
+        """
+        Get a page of records through a new CSW instance, so that several pages can be requested concurrently
+
+        :return: a tuple of (records, results) of this page
+        """
+        csw = self._clone()
+        payload_xml = etree.fromstring(payload)
+        payload_xml.set('startPosition', str(start_position))
+        payload_xml.set('maxRecords', str(nb_records))
+        csw._send_get_records(etree.tostring(payload_xml, encoding='unicode'))
+        return csw.records, csw.results
+
+    def get_records(self, maxrecords=50, max_workers=4, **kwargs):
+        """
+        Send a GetRecords request. The results are stored in self.records property (and parsed once in
+        self.mundi_records property).
+
+        :param maxrecords: maximum number of records to get. Defaults to 50
+        :param max_workers: maximum number of pages requested concurrently, once the first page has been received.
+        Defaults to 4
+        :param kwargs: see OWSLib's getrecords2 (https://github.com/geopython/OWSLib/blob/master/owslib/csw.py).
+        A hint: if "xml" argument is passed (raw WML request), other arguments are ignored. Also, if maxrecords exceeds
+        50, several pages are requested to get maxrecords records (or less if less are found). All pages are sent
+        through the shared HTTP session (see get_session)
+        """
+        # Always set Element Set Name because OWSLib can't read Element Name
+        kwargs['esn'] = 'full'
+        # has xml argument been passed?
+        try:
+            payload = kwargs['xml'].strip()
+        except KeyError:
+            kwargs['maxrecords'] = maxrecords
+            payload = self._get_records_request(**kwargs)
+
+        # get first page (doesn't matter if maxrecords exceeds 50)
+        self._send_get_records(payload)
+
+        # all 'csw:Record' dict from 'GetRecords' request pages
+        all_records = OrderedDict(self.records)
+
+        # the first page tells how many records remain and how many records a page holds
+        next_record = self.results['nextrecord']
+        page_size = self.results['returned']
+        # if next_record is "0", we got all records
+        if next_record > 0 and page_size > 0:
+            nb_remaining = min(maxrecords - len(all_records), self.results['matches'] - next_record + 1)
+        else:
+            nb_remaining = 0
+
+        # get all other pages concurrently, then store them in order
+        pages = [(next_record + offset, min(page_size, nb_remaining - offset))
+                 for offset in range(0, max(nb_remaining, 0), page_size)]
+        for records, results in ordered_map(lambda page: self._get_records_page(payload, *page), pages,
+                                            max_workers):
+            all_records.update(records)
+            self.results = results
+
+        self.records = all_records
+        self.mundi_records = OrderedDict((id_, MundiRecord.from_csw_record(r)) for id_, r in all_records.items())
+
+    def to_dataframe(self):
+        """
+        Get the records found by the last GetRecords request as a pandas DataFrame (see records_to_dataframe)
+
+        :return: a pandas.DataFrame, one row per record
+        """
+        return records_to_dataframe(self.mundi_records.values())
+
+    def to_arrow(self):
+        """
+        Get the records found by the last GetRecords request as an Arrow table (see records_to_arrow)
+
+        :return: a pyarrow.Table, one row per record
+        """
+        return records_to_arrow(self.mundi_records.values())
+
+    def footprint_index(self) -> FootprintIndex:
+        """
+        Get a spatial index of the footprints of the records found by the last GetRecords request (see FootprintIndex)
+
+        :return: a FootprintIndex instance
+        """
+        return FootprintIndex(self.mundi_records.values())
+
+    def _get_volumes_page(self, payload: str, start_position: int, breakdown: str = None, nb_records: int = None):
+        """
+        Get a page of a projected GetRecords request and sum its records' productDatapackSize
+
+        :param nb_records: number of records of the page. If None, the page size of payload
+        :return: a tuple of (total volume, Counter of volumes per breakdown key, 'SearchResults' element attributes)
+        """
+        payload_xml = etree.fromstring(payload)
+        payload_xml.set('startPosition', str(start_position))
+        if nb_records is not None:
+            payload_xml.set('maxRecords', str(nb_records))
+        response = open_url(self.url, etree.tostring(payload_xml, encoding='unicode'), 'Post', timeout=self.timeout)
+
+        # records are parsed and dropped page by page
+        root = etree.fromstring(response.read())
+        search_results = root.find('csw:SearchResults', namespaces=MUNDI_NAMESPACES)
+        volume, volumes = _sum_volumes(map(MundiRecord.from_element, search_results), breakdown)
+        return volume, volumes, dict(search_results.attrib)
+
+    def get_volume_records(self, breakdown: str = None, max_workers: int = 4, **kwargs):
+        """
+        Get an approximation of the total volume of records matched by a request
+        (ie, sum of records' productDatapackSize).
+        Only productDatapackSize, sensingStartDate and productType elements are requested (ElementName projection) and
+        pages are summed as they are received, so that memory usage doesn't depend on the number of records
+
+        :param breakdown: if "day" or "product_type", volumes are also summed by sensing day or by product type
+        :param max_workers: maximum number of pages requested concurrently. Defaults to 4
+        :param kwargs: "maxrecords" (maximum number of records summed, all matched records if not specified), "cql" (CQL
+        filter) or "xml" (raw GetRecords request, other arguments but maxrecords are ignored), see OWSLib's
+        getrecords2 (https://github.com/geopython/OWSLib/blob/master/owslib/csw.py). Other getrecords2 arguments
+        (eg, "constraints") fall back to requesting full records
+        :return: sum of all productDatapackSize in TB. If breakdown is specified, a tuple of (sum of all
+        productDatapackSize in TB, dict of {day or product type: sum of productDatapackSize in TB})
+        """
+        if breakdown not in [None, 'day', 'product_type']:
+            raise ValueError(f"Unsupported breakdown '{breakdown}' (expected 'day' or 'product_type')")
+
+        if 'xml' in kwargs:
+            payload = kwargs['xml'].strip()
+        elif set(kwargs) <= {'cql', 'esn', 'maxrecords'}:
+            payload = get_records_payload(None if kwargs.get('cql') is None else escape(kwargs['cql']))
+        else:
+            payload = None
+
+        if payload is None:
+            # OWSLib request: we need to get all (full) records at first
+            kwargs['esn'] = 'full'
+            if 'maxrecords' not in kwargs:
+                kwargs['maxrecords'] = self.get_nb_records(**kwargs)
+            self.get_records(**kwargs)
+            volume, volumes = _sum_volumes(self.mundi_records.values(), breakdown)
+        else:
+            payload = project_payload(payload, VOLUME_ELEMENTS)
+            max_records = kwargs.get('maxrecords')
+            first_page_size = None
+            if max_records is not None:
+                first_page_size = min(int(max_records), int(etree.fromstring(payload).get('maxRecords', 50)))
+
+            # first page gives the number of matched records and the page size
+            volume, volumes, results = self._get_volumes_page(payload, 1, breakdown, first_page_size)
+            nb_matched = int(results.get('numberOfRecordsMatched', 0))
+            page_size = int(results.get('numberOfRecordsReturned', 0))
+            next_record = int(results.get('nextRecord', 0))
+            nb_records = nb_matched if max_records is None else min(nb_matched, int(max_records))
+
+            # sum other pages as they are received
+            if next_record > 0 and page_size > 0:
+                pages = [(start, min(page_size, nb_records - start + 1))
+                         for start in range(next_record, nb_records + 1, page_size)]
+                for page_volume, page_volumes, _ in ordered_map(
+                        lambda page: self._get_volumes_page(payload, page[0], breakdown, page[1]), pages,
+                        max_workers):
+                    volume += page_volume
+                    volumes.update(page_volumes)
+
+        # convert to TB and round to two decimals
+        if breakdown is None:
+            return round(volume / 1024 ** 4, 2)
+        return round(volume / 1024 ** 4, 2), {k: round(v / 1024 ** 4, 2) for k, v in sorted(volumes.items())}
+
+    def _count_shard(self, shard: QueryShard, geometry: str = None, other_fields: Dict[str, Any] = None) -> int:
+        payload_xml = etree.fromstring(get_records_payload(shard.cql_filter(geometry, other_fields), 0))
+        payload_xml.set('resultType', 'hits')
+        return self._clone().get_nb_records(xml=etree.tostring(payload_xml, encoding='unicode'))
+
+    def plan_shards(self, date_from: Union[str, datetime], date_to: Union[str, datetime], bbox=None,
+                    geometry: str = None, other_fields: Dict[str, Any] = None, max_records: int = 1000,
+                    min_duration: timedelta = timedelta(days=1), min_size: float = 0.1,
+                    max_workers: int = 4) -> List[QueryShard]:
+        """
+        Split a browse request (see MundiDownloader.browse) in shards matching at most max_records records each: the
+        number of records matched by the request is got (see get_nb_records), and the request is recursively split by
+        dates, then by bbox (see QueryShard.split), until shards are small enough
+
+        :param date_from: date from which to search products (eg, "2019-01-01"). Dates without time zone are UTC
+        :param date_to: date until which to search products
+        :param bbox: a bounding box (longitude min, latitude min, longitude max, latitude max)
+        :param geometry: a WKT geometry. Ignored if bbox is specified
+        :param other_fields: any other CQL filter terms, eg: {"DIAS:sensorMode": "IW_"}
+        :param max_records: maximum number of records per shard
+        :param min_duration: minimum duration of shards
+        :param min_size: minimum size (in degrees) of shards' bbox
+        :param max_workers: maximum number of shards counted concurrently
+        :return: the list of shards matching at least one record, with their number of records
+        """
+        pending = [QueryShard(_parse_utc_date(date_from), _parse_utc_date(date_to),
+                              tuple(bbox) if bbox is not None else None)]
+        shards = []
+        while pending:
+            counted = list(ordered_map(
+                lambda shard: shard._replace(nb_records=self._count_shard(shard, geometry, other_fields)), pending,
+                max_workers))
+            pending = []
+            for shard in counted:
+                halves = shard.split(min_duration, min_size) if shard.nb_records > max_records else None
+                if halves is not None:
+                    pending.extend(halves)
+                elif shard.nb_records > 0:
+                    if shard.nb_records > max_records:
+                        logger.warning(f"Shard {shard} can't be split any further ({shard.nb_records} records)")
+                    shards.append(shard)
+
+        logger.info(f"{sum(s.nb_records for s in shards)} records in {len(shards)} shards")
+        return shards
+
+    def get_records_sharded(self, date_from: Union[str, datetime], date_to: Union[str, datetime], bbox=None,
+                            geometry: str = None, other_fields: Dict[str, Any] = None, max_records: int = 1000,
+                            max_workers: int = 4, **kwargs):
+        """
+        Get all records matched by a browse request (see MundiDownloader.browse), whatever their number: the request is
+        split in shards (see plan_shards), which are requested concurrently. Records matched by several shards (eg,
+        whose footprint overlaps shards' bbox) are kept once. Results are stored as with get_records
+
+        :param max_records: maximum number of records per shard
+        :param max_workers: maximum number of shards requested concurrently
+        :param kwargs: see plan_shards
+        """
+        shards = self.plan_shards(date_from, date_to, bbox, geometry, other_fields, max_records,
+                                  max_workers=max_workers, **kwargs)
+
+        def get_shard_records(shard: QueryShard):
+            csw = self._clone()
+            csw.get_records(maxrecords=shard.nb_records, xml=get_records_payload(
+                shard.cql_filter(geometry, other_fields)))
+            return csw.records
+
+        all_records = OrderedDict()
+        for records in ordered_map(get_shard_records, shards, max_workers):
+            for id_, record in records.items():
+                all_records.setdefault(id_, record)
+
+        logger.info(f"{len(all_records)} distinct records got from {len(shards)} shards")
+        self.records = all_records
+        self.mundi_records = OrderedDict((id_, MundiRecord.from_csw_record(r)) for id_, r in all_records.items())
+
+    def get_nb_records(self, **kwargs):
+        """
+        Get number of records matched by a GetRecord request
+
+        :param kwargs: see OWSLib's getrecords2 (https://github.com/geopython/OWSLib/blob/master/owslib/csw.py).
+        A hint: if "xml" argument is passed (raw WML request), other arguments are ignored. "maxrecords" is ignored
+        and set to 0.
+        :return: number of records (i.e. 'numberOfRecordsMatched' value)
+        """
+        kwargs['maxrecords'] = 0
+        # No need to load all metadata here
+        kwargs['esn'] = 'brief'
+        # get only first page
+        try:
+            payload = kwargs.pop('xml').strip()
+        except KeyError:
+            payload = self._get_records_request(**kwargs)
+        self._send_get_records(payload)
+        return int(int(self.results['matches']))
+
+    # ---------------------------------
+    # Functions for retro compatibility
+    # ---------------------------------
+    def mundigetrecords2(self, xml):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "get_records" function instead')
+        return self.get_records(xml=xml)
+
+    def mundigetvolrecords2(self, xml):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "get_volume_records" function instead')
+        return self.get_volume_records(xml=xml)
+
+    def mundigetnbrecords2(self, xml):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "get_nb_records" function instead')
+        return self.get_nb_records(xml=xml)
+
+
+# --------------------------
+# DOWNLOADER
+# --------------------------
+def match_filters(path: str, include: Iterable[str] = None, exclude: Iterable[str] = None) -> bool:
+    """
+    Check whether a file path is selected by include / exclude glob patterns. Patterns are matched against the path and
+    against the file name
+
+    :param path: the file path
+    :param include: the patterns of selected files. If None, all files are selected
+    :param exclude: the patterns of files not selected
+    :return: True if the file is selected
+    """
+    def matches(patterns):
+        return any(fnmatch(path, p) or fnmatch(basename(path), p) for p in patterns)
+
+    return (include is None or matches(include)) and (exclude is None or not matches(exclude))
+
+
+class S3Object(NamedTuple):
+    # an object to download (or a member to extract from a zip object), and where to download it
+    bucket: str
+    key: str
+    target_path: str
+    size: int
+    etag: str = None
+    member: str = None
+    # size of the extracted member (size is the number of bytes to read from the archive)
+    member_size: int = None
+
+    @property
+    def target_size(self) -> int:
+        """Size of the target file once downloaded (or extracted)"""
+        return self.size if self.member is None else self.member_size
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object. Each read is a ranged GET, so that only the bytes actually read
+    are transferred (eg, the central directory and some members of a zip archive)
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, size: int = None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size = size if size is not None else s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        # reads starting before this offset stop at it, eg at the end of a member of an archive (see S3Archive)
+        self.stop = None
+        # number of bytes got from object storage
+        self.transferred = 0
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+        last_byte = min(self._position + len(buffer), self.size) - 1
+        if self.stop is not None and self._position < self.stop:
+            last_byte = min(last_byte, self.stop - 1)
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key,
+                                             Range=f"bytes={self._position}-{last_byte}")
+        data = response["Body"].read()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        self.transferred += len(data)
+        return len(data)
+
+
+def open_s3_archive(s3_client, bucket: str, key: str, size: int = None,
+                    buffer_size: int = 4 * 1024 ** 2) -> zipfile.ZipFile:
+    """
+    Open a zip archive stored on S3 without downloading it: its central directory and members are read with ranged GETs
+
+    :param s3_client: the boto3 S3 client
+    :param bucket: the bucket of the archive
+    :param key: the key of the archive
+    :param size: the size of the archive, if known (saves a HEAD request)
+    :param buffer_size: maximum size of the ranges read at once
+    :return: an S3Archive instance
+    """
+    return S3Archive(S3RangeReader(s3_client, bucket, key, size), buffer_size)
+
+
+class S3Archive(zipfile.ZipFile):
+    """
+    A zip archive read from S3 (see open_s3_archive). Unlike zipfile.ZipFile, the reads of a member stop at its end, and
+    closing the archive also closes the reader it was opened on
+    """
+
+    def __init__(self, reader: S3RangeReader, buffer_size: int = 4 * 1024 ** 2):
+        self.reader = reader
+        super().__init__(io.BufferedReader(reader, buffer_size))
+
+    def open(self, name, mode='r', pwd=None, **kwargs):
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        # local header (its extra field is usually the one of the central directory), then data
+        self.reader.stop = (info.header_offset + zipfile.sizeFileHeader + len(info.filename.encode()) + len(info.extra)
+                            + info.compress_size)
+        return super().open(info, mode, pwd, **kwargs)
+
+    def close(self):
+        fp = self.fp
+        try:
+            super().close()
+        finally:
+            if fp is not None:
+                fp.close()
+
+
+class DownloadManifest:
+    """
+    Persisted state of the downloads made in a folder, as a JSON lines file: one line is appended each time a part of an
+    object, or a whole object, has been downloaded. Lines are never rewritten, so that a crash can't corrupt the
+    manifest
+    """
+    FILENAME = ".mundi_manifest.jsonl"
+
+    def __init__(self, folder: str):
+        self.path = join(folder, self.FILENAME)
+        self._lock = threading.Lock()
+        # (bucket, key, member): {"etag": ..., "size": ..., "parts": set of downloaded parts, "complete": ...}
+        self._objects = {}
+
+        if exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        # last line may have been truncated by a crash
+                        logger.debug(f"Ignoring invalid manifest line: {line}")
+
+    def _apply(self, entry: Dict[str, Any]):
+        object_key = (entry["bucket"], entry["key"], entry.get("member"))
+        state = self._objects.get(object_key)
+        if state is None or state["etag"] != entry["etag"]:
+            # first entry for this object, or the object has changed since previous entries
+            state = {"etag": entry["etag"], "size": entry["size"], "parts": set(), "complete": False}
+            self._objects[object_key] = state
+
+        if "part" in entry:
+            state["parts"].add(entry["part"])
+        if entry.get("complete"):
+            state["complete"] = True
+
+    def _append(self, obj: S3Object, **fields):
+        entry = dict(bucket=obj.bucket, key=obj.key, etag=obj.etag, size=obj.size, **fields)
+        if obj.member is not None:
+            # members extracted from an archive are recorded apart from the archive
+            entry["member"] = obj.member
+        with self._lock:
+            self._apply(entry)
+            os.makedirs(dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def is_complete(self, obj: S3Object) -> bool:
+        """Check if an object (or member) has already been downloaded (same ETag and size, file still on disk)"""
+        state = self._objects.get((obj.bucket, obj.key, obj.member))
+        return (state is not None and state["complete"] and state["etag"] == obj.etag and state["size"] == obj.size
+                and exists(obj.target_path) and os.path.getsize(obj.target_path) == obj.target_size)
+
+    def downloaded_parts(self, obj: S3Object) -> set:
+        """Get the parts of an object which have already been downloaded (empty if the object has changed)"""
+        state = self._objects.get((obj.bucket, obj.key, obj.member))
+        if state is None or state["etag"] != obj.etag or state["size"] != obj.size:
+            return set()
+        return set(state["parts"])
+
+    def part_done(self, obj: S3Object, part: int):
+        self._append(obj, part=part)
+
+    def object_done(self, obj: S3Object):
+        self._append(obj, complete=True)
+
+
+class MundiDownloader:
+
+    def __init__(self, collection: MundiCollection, access_key: str, secret_key: str,
+                 endpoint_url: str = MUNDI_S3_ENDPOINT):
+        boto3, config_class = _import_lazily('boto3'), _import_lazily('Config')
+
+        self.csw = collection.mundi_csw()
+        self.s3_client = boto3.client("s3", aws_access_key_id=access_key,
+                                      aws_secret_access_key=secret_key,
+                                      endpoint_url=endpoint_url,
+                                      config=config_class(max_pool_connections=50))
+        instrument_s3_client(self.s3_client)
+        # credentials are also handed to GDAL when rasters are read in place (see open_band)
+        self._access_key, self._secret_key = access_key, secret_key
+        # objects found under each product prefix, as {(bucket, prefix): list of objects}
+        self._listings = {}
+
+    @property
+    def records(self):
+        return self.csw.records
+
+    @property
+    def mundi_records(self):
+        return self.csw.mundi_records
+
+    def browse(self, date_from: str = None, date_to: str = None, geometry: str = None,
+               bbox: Iterable[Union[float, int, str]] = None, other_fields: Dict[str, Any] = None,
+               sharded: bool = False, max_records: int = 1000, max_workers: int = 4, mirror=None):
+        """
+        Browse catalog and store results in "records" property.
+        :param date_from: date from which to search products
+        :param date_to: date until which to search products
+        :param geometry: a WKT geometry, basically a POLYGON, eg "POLYGON ((0 1, 2 1, 2 0, 0 0, 0 1))". Ignored if bbox is specified
+        :param bbox: a bounding box (longitude min, latitude min, longitude max, latitude max), eg (1., 0., 3., 4.)
+        :param other_fields: any other CQL filter terms, eg: {"DIAS:sensorMode": "IW_"}
+        :param sharded: if True, the query is split in shards requested concurrently, so that all records are got
+        whatever their number (see MundiCSW.get_records_sharded). date_from and date_to are then required
+        :param max_records: maximum number of records per shard
+        :param max_workers: maximum number of shards requested concurrently
+        :param mirror: a MundiCatalogMirror (see mundilib.mirror) of the collection: if specified, records are browsed
+        locally, in the records harvested by the mirror
+        """
+        if mirror is not None:
+            mirror.load_records(self.csw, date_from=date_from, date_to=date_to, geometry=geometry, bbox=bbox,
+                                other_fields=other_fields)
+            return
+        if sharded:
+            if date_from is None or date_to is None:
+                raise MundiException("A sharded browse requires both date_from and date_to")
+            self.csw.get_records_sharded(date_from, date_to, bbox, geometry, other_fields, max_records, max_workers)
+            return
+
+        xml_string = get_records_payload(browse_filter(date_from, date_to, geometry, bbox, other_fields))
+
+        # search the catalog
+        self.csw.get_records(xml=xml_string)
+
+    def download(self, target_folder: str = ".", max_workers: int = 4, max_parts: int = 10, resume: bool = True,
+                 include: Iterable[str] = None, exclude: Iterable[str] = None, dry_run: bool = False,
+                 extract: bool = False):
+        """
+        Download products, based on "records" property content
+        :param target_folder: the folder where to download products
+        :param max_workers: maximum number of products listed and objects downloaded concurrently
+        :param max_parts: maximum number of parts of a large object (multipart download) downloaded concurrently
+        :param resume: if True (default), downloads are recorded in a manifest in target_folder: objects already
+        downloaded (or members already extracted) are skipped and partially downloaded objects are resumed (see
+        DownloadManifest). If False, everything is downloaded again
+        :param include: glob patterns (eg, ["*_B04_10m.jp2", "*_B08_10m.jp2"]) of the files to download from extracted
+        products (or to extract from zipped products, if extract is True), matched against file names and paths within
+        products. If None, all files are downloaded
+        :param exclude: glob patterns of the files not to download from extracted products (or not to extract from
+        zipped products, if extract is True)
+        :param dry_run: if True, nothing is downloaded
+        :param extract: if True, the (selected) members of zipped products are read directly from object storage and
+        extracted in target_folder: archives are never downloaded as a whole
+        :return: the number of bytes transferred (or which would be transferred, if dry_run is True)
+        """
+        return self._download_products(self.mundi_records, target_folder, max_workers, max_parts, resume, include,
+                                       exclude, dry_run, extract)
+
+    def download_by_id(self, record_id: str, target_folder: str = ".", max_parts: int = 10, resume: bool = True,
+                       include: Iterable[str] = None, exclude: Iterable[str] = None, dry_run: bool = False,
+                       extract: bool = False):
+        """
+        Download a specific record
+        :param record_id: the identifier of this record
+        :param target_folder: the folder where to download this product
+        :param max_parts: maximum number of parts of a large object (multipart download) downloaded concurrently
+        :param resume: if True (default), an object already downloaded is skipped and a partially downloaded object
+        is resumed (see DownloadManifest)
+        :param include: glob patterns of the files to download if the product is extracted (see download)
+        :param exclude: glob patterns of the files not to download if the product is extracted (see download)
+        :param dry_run: if True, nothing is downloaded
+        :param extract: if True and the product is zipped, (selected) members are extracted without downloading the
+        archive (see download)
+        :return: the number of bytes transferred (or which would be transferred, if dry_run is True)
+        """
+        # retrieve the ID from the catalog
+        self.csw.get_records(cql=f"dc:identifier = {record_id}", esn="full")
+        try:
+            record = self.mundi_records[record_id]
+        except KeyError:
+            raise ValueError(f"Failed to find a record with ID '{record_id}'")
+
+        # download the product
+        return self._download_products({record_id: record}, target_folder, 4, max_parts, resume, include, exclude,
+                                       dry_run, extract)
+
+    def open_band(self, record_id: str, band: str, window: Iterable[float] = None):
+        """
+        Read a band of a product, without downloading it: only the blocks of the raster file which intersect window are
+        read from object storage (through the raster file within the archive, if the product is zipped).
+        Requires rasterio.
+        :param record_id: the ID of the product, eg "S2A_MSIL1C_20200101T105441_N0208_R051_T31TCJ_20200101T111522"
+        :param band: the band to read, eg "B04" or "B04_10m". It is matched against the names of the raster files
+        (.jp2, .tif) of the product: if several files match, the first one (in alphabetical order) is read
+        :param window: a bounding box (longitude min, latitude min, longitude max, latitude max), eg (1., 43., 1.1, 43.1).
+        If None, the whole band is read
+        :return: a 2D numpy array
+        """
+        import rasterio
+        from rasterio.warp import transform_bounds
+        from rasterio.windows import from_bounds
+
+        # retrieve the record, from the catalog if it hasn't been browsed
+        record = self.mundi_records.get(record_id)
+        if record is None:
+            self.csw.get_records(cql=f"dc:identifier = {record_id}", esn="full")
+            try:
+                record = self.mundi_records[record_id]
+            except KeyError:
+                raise ValueError(f"Failed to find a record with ID '{record_id}'")
+
+        # find the raster file of the band, either within the archive or among the extracted files
+        include = [f"*{band}*{extension}" for extension in RASTER_EXTENSIONS]
+        objects = sorted(self._list_product(record_id, record, ".", include, extract=True),
+                         key=lambda o: o.member or o.key)
+        if len(objects) == 0:
+            raise MundiException(f"Failed to find band {band} in product {record_id}")
+        obj = objects[0]
+        if obj.member is not None:
+            path = f"/vsizip//vsis3/{obj.bucket}/{obj.key}/{obj.member}"
+        else:
+            path = f"/vsis3/{obj.bucket}/{obj.key}"
+
+        with self._raster_env(), rasterio.open(path) as dataset:
+            if window is None:
+                return dataset.read(1)
+            # window is converted to the CRS, then to the pixel grid, of the raster
+            bounds = transform_bounds("EPSG:4326", dataset.crs, *window)
+            pixels = from_bounds(*bounds, transform=dataset.transform).round_offsets().round_lengths()
+            return dataset.read(1, window=pixels, boundless=True, fill_value=dataset.nodata or 0)
+
+    def _raster_env(self):
+        # GDAL reads objects through the same endpoint and credentials as the S3 client
+        import rasterio
+        from rasterio.session import AWSSession
+
+        endpoint = urlparse(self.s3_client.meta.endpoint_url)
+        session = AWSSession(aws_access_key_id=self._access_key, aws_secret_access_key=self._secret_key,
+                             region_name=self.s3_client.meta.region_name, endpoint_url=endpoint.netloc)
+        return rasterio.Env(session=session, AWS_HTTPS="YES" if endpoint.scheme == "https" else "NO",
+                            AWS_VIRTUAL_HOSTING="FALSE", GDAL_DISABLE_READDIR_ON_OPEN="EMPTY_DIR")
+
+    def _download_products(self, records: Dict[str, MundiRecord], target_folder: str, max_workers: int,
+                           max_parts: int, resume: bool, include: Iterable[str] = None, exclude: Iterable[str] = None,
+                           dry_run: bool = False, extract: bool = False) -> int:
+        transfer_config = _import_lazily('TransferConfig')(max_concurrency=max_parts)
+        manifest = DownloadManifest(target_folder) if resume else None
+        start = time.time()
+        # zip archives being extracted, by thread: they are all closed once the downloads end
+        archives = threading.local()
+
+        with ExitStack() as opened_archives, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # find out the objects of all products
+            objects = [o for product_objects in executor.map(
+                lambda item: self._list_product(*item, target_folder, include, exclude, extract), records.items())
+                       for o in product_objects]
+
+            if dry_run:
+                transferred = sum(o.size for o in objects if manifest is None or not manifest.is_complete(o))
+                logger.info(f"{len(records)} products ({len(objects)} objects): {transferred / 1024 ** 2:.1f} MB "
+                            f"would be transferred")
+                return transferred
+
+            # download all objects, whatever the product they belong to
+            def download_object(o: S3Object) -> int:
+                if o.member is not None:
+                    return self._extract_member(o, archives, opened_archives, manifest)
+                if manifest is None:
+                    return self._download_object(o, transfer_config)
+                return self._resume_object(o, manifest, transfer_config)
+
+            transferred = sum(executor.map(download_object, objects))
+
+        # report aggregate throughput
+        elapsed = time.time() - start
+        size = sum(o.size for o in objects)
+        logger.info(f"Downloaded {len(records)} products ({len(objects)} objects, {transferred / 1024 ** 2:.1f} MB "
+                    f"transferred out of {size / 1024 ** 2:.1f} MB) in {elapsed:.1f} s "
+                    f"({transferred / 1024 ** 2 / max(elapsed, 1e-3):.1f} MB/s)")
+        return transferred
+
+    def _list_product(self, record_id: str, record: MundiRecord, target_folder: str, include: Iterable[str] = None,
+                      exclude: Iterable[str] = None, extract: bool = False) -> List[S3Object]:
+        logger.info(f"Listing {record_id}")
+
+        # get bucket & prefix from URI
+        uri = record.archive_product_uri
+        bucket, prefix = uri.split(".com/")[-1].split("/", 1)
+
+        # find out what's within this prefix
+        list_contents = self._list_objects(bucket, prefix)
+
+        if len(list_contents) == 0:
+            logger.warning(f"Did not find any object at s3://{bucket}/{prefix}")
+            return []
+        elif len(list_contents) == 1:
+            # there's a single file for this product, it is archived (zip)
+            key = list_contents[0]["Key"]
+            if extract:
+                return self._list_archive(bucket, key, list_contents[0]["Size"], list_contents[0].get("ETag"),
+                                          target_folder, include, exclude)
+            return [S3Object(bucket, key, join(target_folder, basename(key)), list_contents[0]["Size"],
+                             list_contents[0].get("ETag"))]
+        else:
+            # this product has been extracted, we must download all the (selected) keys
+            objects = []
+            for x in list_contents:
+                relative_path = x["Key"].replace(dirname(prefix), "").lstrip("/")
+                if match_filters(relative_path, include, exclude):
+                    objects.append(S3Object(bucket, x["Key"], join(target_folder, relative_path), x["Size"],
+                                            x.get("ETag")))
+            return objects
+
+    def _list_archive(self, bucket: str, key: str, size: int, etag: str, target_folder: str,
+                      include: Iterable[str] = None, exclude: Iterable[str] = None) -> List[S3Object]:
+        # read the central directory of the archive (the archive itself is not downloaded)
+        with open_s3_archive(self.s3_client, bucket, key, size) as archive:
+            infos = [info for info in archive.infolist()
+                     if not info.is_dir() and match_filters(info.filename, include, exclude)]
+
+        objects = []
+        for info in infos:
+            # members must not be extracted out of target folder
+            target_path = abspath(join(target_folder, info.filename))
+            if not target_path.startswith(abspath(target_folder) + os.sep):
+                logger.warning(f"Skipping member {info.filename} of s3://{bucket}/{key} (invalid path)")
+                continue
+            # size is the number of bytes to read from the archive
+            objects.append(S3Object(bucket, key, target_path, info.compress_size, etag, info.filename, info.file_size))
+        return objects
+
+    def _extract_member(self, obj: S3Object, archives: threading.local, opened_archives: ExitStack,
+                        manifest: DownloadManifest = None) -> int:
+        # skip members which have already been extracted (from the same archive)
+        if manifest is not None and manifest.is_complete(obj):
+            logger.debug(f"Skipping {obj.member} of s3://{obj.bucket}/{obj.key}, already extracted")
+            return 0
+
+        # archives are opened once per thread, and kept open while their members are extracted
+        archive = getattr(archives, "archive", None)
+        if archive is None or archives.key != (obj.bucket, obj.key):
+            if archive is not None:
+                archive.close()
+            archive = opened_archives.enter_context(open_s3_archive(self.s3_client, obj.bucket, obj.key))
+            archives.archive, archives.key = archive, (obj.bucket, obj.key)
+            transferred = 0
+        else:
+            transferred = archive.reader.transferred
+
+        # member is streamed from object storage to target file
+        os.makedirs(dirname(obj.target_path), exist_ok=True)
+        part_path = f"{obj.target_path}.part"
+        with archive.open(obj.member) as src, open(part_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 ** 2)
+        os.replace(part_path, obj.target_path)
+        if manifest is not None:
+            manifest.object_done(obj)
+        # bytes actually got, including the central directory if the archive has just been opened
+        return archive.reader.transferred - transferred
+
+    def _list_objects(self, bucket: str, prefix: str, fanout_depth: int = 4, max_workers: int = 8) -> List[Dict]:
+        """
+        List all objects under a prefix. The first levels of "folders" are listed with a delimiter so that their
+        sub-prefixes (eg, GRANULE/*/IMG_DATA) can then be listed concurrently; each listing is paginated. Listings are
+        cached per prefix
+
+        :param bucket: the bucket to list
+        :param prefix: the prefix to list
+        :param fanout_depth: number of "folder" levels listed before listing sub-prefixes recursively
+        :param max_workers: maximum number of concurrent listings
+        :return: the objects, as dicts returned by list_objects_v2 ("Key", "Size", "ETag"...), sorted by key
+        """
+        if (bucket, prefix) in self._listings:
+            return self._listings[(bucket, prefix)]
+
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+
+        def list_prefix(sub_prefix: str, delimiter: str):
+            objects, sub_prefixes = [], []
+            for page in paginator.paginate(Bucket=bucket, Prefix=sub_prefix, Delimiter=delimiter):
+                objects += page.get("Contents", [])
+                sub_prefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+            return objects, sub_prefixes
+
+        # walk down the first levels, concurrently at each level
+        list_contents, prefixes = [], [prefix]
+        for _ in range(fanout_depth):
+            next_prefixes = []
+            for objects, sub_prefixes in ordered_map(lambda p: list_prefix(p, "/"), prefixes, max_workers):
+                list_contents += objects
+                next_prefixes += sub_prefixes
+            prefixes = next_prefixes
+            if not prefixes:
+                break
+
+        # then list deeper levels entirely
+        for objects, _ in ordered_map(lambda p: list_prefix(p, ""), prefixes, max_workers):
+            list_contents += objects
+
+        list_contents.sort(key=lambda x: x["Key"])
+        self._listings[(bucket, prefix)] = list_contents
+        return list_contents
+
+    def _download_object(self, obj: S3Object, transfer_config: TransferConfig = None) -> int:
+        # create target folder
+        os.makedirs(dirname(obj.target_path), exist_ok=True)
+
+        # download file (large files are downloaded in several parts, concurrently)
+        self.s3_client.download_file(Bucket=obj.bucket, Key=obj.key, Filename=obj.target_path, Config=transfer_config)
+        return obj.size
+
+    def _resume_object(self, obj: S3Object, manifest: DownloadManifest, transfer_config: TransferConfig) -> int:
+        # skip objects which have already been downloaded
+        if manifest.is_complete(obj):
+            logger.debug(f"Skipping s3://{obj.bucket}/{obj.key}, already downloaded")
+            return 0
+
+        # the object is downloaded in a ".part" file, by ranges (parts) which are recorded in the manifest once written
+        os.makedirs(dirname(obj.target_path), exist_ok=True)
+        part_path = f"{obj.target_path}.part"
+        part_size = transfer_config.multipart_chunksize if obj.size >= transfer_config.multipart_threshold \
+            else max(obj.size, 1)
+        nb_parts = (obj.size + part_size - 1) // part_size
+
+        downloaded_parts = manifest.downloaded_parts(obj) if exists(part_path) else set()
+        if not downloaded_parts:
+            with open(part_path, "wb") as f:
+                f.truncate(obj.size)
+
+        def download_part(part: int) -> int:
+            first_byte, last_byte = part * part_size, min((part + 1) * part_size, obj.size) - 1
+            kwargs = {"IfMatch": obj.etag} if obj.etag is not None else {}
+            response = self.s3_client.get_object(Bucket=obj.bucket, Key=obj.key,
+                                                 Range=f"bytes={first_byte}-{last_byte}", **kwargs)
+            with open(part_path, "r+b") as f:
+                f.seek(first_byte)
+                for chunk in response["Body"].iter_chunks(1024 ** 2):
+                    f.write(chunk)
+            manifest.part_done(obj, part)
+            return last_byte - first_byte + 1
+
+        missing_parts = [part for part in range(nb_parts) if part not in downloaded_parts]
+        if downloaded_parts:
+            logger.info(f"Resuming s3://{obj.bucket}/{obj.key} ({len(missing_parts)}/{nb_parts} parts missing)")
+        transferred = sum(ordered_map(download_part, missing_parts, transfer_config.max_request_concurrency))
+
+        os.replace(part_path, obj.target_path)
+        manifest.object_done(obj)
+        return transferred
+
+
+# --------------------------
+# COLLECTION
+# --------------------------
+class MundiCollection:
+
+    def __init__(self, name: str):
+        # collection name, formatted as in catalog URIs
+        self.name = name
+        # OpenSearch description, downloaded when first used
+        self._opensearch_description = None
+        self._opensearch_description_lock = threading.Lock()
+        if self.name != "Landsat8":
+            # OpenSearch description URL
+            self.opensearch_description_url = f'https://{self.name}.browse.catalog.mundiwebservices.com/opensearch/description.xml'
+
+            # CSW endpoint for this collection
+            self.csw_endpoint = f'https://{self.name}.browse.catalog.mundiwebservices.com/csw?service=CSW'
+
+    @property
+    def opensearch_description(self) -> OpenSearchDescription:
+        """
+        Get the OpenSearch description of this collection. It is downloaded (or read from cache) on first access
+        :return: an OpenSearchDescription instance
+        """
+        with self._opensearch_description_lock:
+            if self._opensearch_description is None:
+                self._opensearch_description = OpenSearchDescription(self.opensearch_description_url)
+        return self._opensearch_description
+
+    def _service_end_point(self, service: str, dataset: str) -> str:
+        """Get service endpoint"""
+        try:
+            if service == 'wms':
+                if self.name == 'Landsat8':
+                    return MUNDI_SERVICES_ENDPOINTS['wms_l8'] + MUNDI_COLLECTION_IDS[f'{self.name}-{dataset}']
+                else:
+                    return MUNDI_SERVICES_ENDPOINTS[service] + MUNDI_COLLECTION_IDS[f'{self.name}-{dataset}']
+            else:
+                return MUNDI_SERVICES_ENDPOINTS[service] + MUNDI_COLLECTION_IDS[f'{self.name}-{dataset}']
+        except KeyError:
+            raise MundiException(ErrorMessages.UNAVAILABLE_COLLECTION_SERVICE)
+
+    @property
+    def product_types(self) -> Dict:
+        """
+        Get supported product types for this collection
+        :return: all product types for this collection as a dict of {value: label}
+        """
+        product_type_xml = self.opensearch_description.findall('.//param:Parameter[@name="productType"]/param:Option')
+        res = {}
+
+        if product_type_xml is not None:
+            for option in product_type_xml:
+                res[option.get('value')] = option.get('label')
+
+        return res
+
+    @property
+    def processing_levels(self) -> Dict:
+        """
+        Get supported processing levels for this collection
+
+        :return: all processing levels for this collection as a dict of {value: label}
+        """
+        processing_levels_xml = self.opensearch_description.findall(
+            './/param:Parameter[@name="processingLevel"]/param:Option')
+        res = {}
+
+        if processing_levels_xml is not None:
+            for option in processing_levels_xml:
+                res[option.get('value')] = option.get('label')
+
+        return res
+
+    def mundi_csw(self, version: str = "2.0.2") -> MundiCSW:
+        """
+        Get a MundiCSW instance for this collection
+
+        :param version: CSW version
+        :return: a MundiCSW instance
+        """
+        if version in ["2.0.2"]:
+            return MundiCSW(self.csw_endpoint, version)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    def mundi_wms(self, dataset: str, version: str = "1.1.1", cache: bool = True) -> WebMapService:
+        """
+        Get a WebMapService instance for this collection
+
+        :param dataset: the target dataset (eg, "L1C" if collection is "Sentinel2"
+        :param version: WMS version (supported versions are: 1.1.1, 1.3.0)
+        :param cache: whether to reuse a cached instance (see ServiceCache). Defaults to True
+        :return: a WebMapService instance
+        """
+        if version in ["1.1.1", "1.3.0"]:
+            return get_service('wms', self._service_end_point('wms', dataset), version, cache)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    def mundi_wmts(self, dataset: str, version: str = "1.0.0", cache: bool = True) -> WebMapTileService:
+        """
+        Get a WebMapTileService instance for this collection
+
+        :param dataset: the target dataset (eg, "L1C" if collection is "Sentinel1"
+        :param version: WMTS version (only 1.0.0 is supported)
+        :param cache: whether to reuse a cached instance (see ServiceCache). Defaults to True
+        :return: a WebMapTileService instance
+        """
+        if version in ["1.0.0"]:
+            return get_service('wmts', self._service_end_point('wmts', dataset), version, cache)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    def mundi_wfs(self, dataset: str, version: str = "2.0.0", cache: bool = True) -> WebFeatureService:
+        """
+        Get a WebFeatureService instance for this collection
+
+        :param dataset: the target dataset (eg, "L1C" if collection is "Sentinel1"
+        :param version: WFS version (only 2.0.0 is supported)
+        :param cache: whether to reuse a cached instance (see ServiceCache). Defaults to True
+        :return: a WebFeatureService instance
+        """
+        if version in ["2.0.0"]:
+            return get_service('wfs', self._service_end_point('wfs', dataset), version, cache)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    def mundi_wcs(self, dataset: str, version: str = "1.0.0", cache: bool = True) -> WebCoverageService:
+        """
+        Get a WebCoverageService instance for this collection
+
+        :param dataset: the target dataset (eg, "L1C" if collection is "Sentinel1"
+        :param version: WCS version (supported versions are: 1.0.0, 1.1.0, 1.1.1, 1.1.2)
+        :param cache: whether to reuse a cached instance (see ServiceCache). Defaults to True
+        :return: a WebCoverageService instance
+        """
+        if version in ["1.0.0", "1.1.0", "1.1.1", "1.1.2"]:
+            return get_service('wcs', self._service_end_point('wcs', dataset), version, cache)
+        else:
+            raise MundiException(ErrorMessages.UNSUPPORTED_SERVICE)
+
+    def mundi_downloader(self, access_key: str, secret_key: str) -> MundiDownloader:
+        """
+        Get a MundiDownloader for this collection
+
+        :param access_key: the access key to authenticate the user to access buckets
+        :param secret_key: the secret key to authenticate the user to access buckets
+        :return: a MundiDownloader instance
+        """
+        return MundiDownloader(self, access_key, secret_key)
+
+    # ---------------------------------
+    # Functions for retro compatibility
+    # ---------------------------------
+    def productTypes(self):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "product_types" property instead')
+        return self.product_types
+
+    def processingLevels(self):
+        logger.warning(
+            'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+            'future versions, please consider using "processing_levels" property instead')
+        return self.processing_levels
+
+
+# --------------------------
+# CSW RECORD
+# --------------------------
+def _parse_date(text: str) -> datetime:
+    # catalogue dates are ISO 8601 formatted, eg "2019-05-20T00:08:33Z"
+    return datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+
+class MundiRecord:
+    """
+    Compact view of a catalogue record (csw:Record or OpenSearch atom:entry). The XML is parsed only once, when the
+    record is built, and only the most used fields are kept
+    """
+    # record field: (XML element local name, conversion function)
+    FIELDS = {
+        'identifier': ('identifier', str),
+        'product_type': ('productType', str),
+        'footprint': ('footprint', str),
+        'sensing_start_date': ('sensingStartDate', _parse_date),
+        'sensing_stop_date': ('sensingStopDate', _parse_date),
+        'product_datapack_size': ('productDatapackSize', lambda text: int(float(text))),
+        'archive_product_uri': ('archiveProductURI', str),
+        'online_status': ('onlineStatus', str),
+        'cloud_cover': ('cloudCoverPercentage', float)
+    }
+    # XML element local name: record field
+    _ELEMENTS = {element: field for field, (element, _) in FIELDS.items()}
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    def __repr__(self):
+        return f'MundiRecord({self.identifier!r})'
+
+    @classmethod
+    def from_element(cls, element: etree.Element) -> MundiRecord:
+        """
+        Build a MundiRecord from a csw:Record or an atom:entry element
+
+        :param element: the record element
+        :return: a MundiRecord instance
+        """
+        fields = {}
+        for child in element:
+            if not isinstance(child.tag, str) or child.text is None:
+                continue
+            field = cls._ELEMENTS.get(etree.QName(child).localname)
+            if field is not None and field not in fields:
+                try:
+                    fields[field] = cls.FIELDS[field][1](child.text.strip())
+                except ValueError:
+                    logger.debug(f"Invalid {field} value: {child.text}")
+
+        # OpenSearch entries may only have an atom:id
+        if 'identifier' not in fields:
+            node_id = element.find('atom:id', namespaces=MUNDI_NAMESPACES)
+            if node_id is not None:
+                fields['identifier'] = node_id.text
+
+        return cls(**fields)
+
+    @classmethod
+    def from_csw_record(cls, csw_record: CswRecord) -> MundiRecord:
+        """
+        Build a MundiRecord from a CswRecord instance
+
+        :param csw_record: the CswRecord instance
+        :return: a MundiRecord instance
+        """
+        return cls.from_element(etree.fromstring(csw_record.xml))
+
+
+def get_node(csw_record: CswRecord, child_name: str):
+    """
+    Get the child of a CswRecord instance. The record's XML is parsed at each call: prefer MundiRecord fields for
+    repeated accesses
+
+    :param csw_record: the CswRecord instance
+    :param child_name: the name of the child to retrieve
+    :return: an etree.Element for this child
+    """
+    root_node = etree.fromstring(csw_record.xml)
+    return root_node.find(child_name, namespaces=MUNDI_NAMESPACES)
+
+
+# For retro compatibility
+def findnode(cswRecord: CswRecord, match: str):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "get_node" function instead')
+    return get_node(cswRecord, match)
+
+
+# --------------------------
+# COLUMNAR EXPORT
+# --------------------------
+# columns holding dates, sizes and floats (other columns hold strings)
+DATE_COLUMNS = ['sensing_start_date', 'sensing_stop_date']
+INTEGER_COLUMNS = ['product_datapack_size']
+FLOAT_COLUMNS = ['cloud_cover']
+
+
+def records_to_columns(records: Iterable[MundiRecord]) -> Dict[str, List]:
+    """
+    Convert records to columns. Footprints are converted from WKT to WKB (shapely is required)
+
+    :param records: the MundiRecord instances
+    :return: a dict of {field: list of values}
+    """
+    from shapely import wkt
+
+    columns = {field: [] for field in MundiRecord.FIELDS}
+    for record in records:
+        for field, values in columns.items():
+            values.append(getattr(record, field))
+
+    columns['footprint'] = [None if f is None else wkt.loads(f).wkb for f in columns['footprint']]
+    return columns
+
+
+def records_to_dataframe(records: Iterable[MundiRecord]):
+    """
+    Convert records to a pandas DataFrame with typed columns: dates are UTC timestamps, sizes are (nullable) integers
+    and footprints are WKB
+
+    :param records: the MundiRecord instances
+    :return: a pandas.DataFrame, one row per record
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(records_to_columns(records), columns=list(MundiRecord.FIELDS))
+    for column in DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], utc=True)
+    for column in INTEGER_COLUMNS:
+        df[column] = df[column].astype('Int64')
+    for column in FLOAT_COLUMNS:
+        df[column] = df[column].astype('float64')
+    return df
+
+
+def records_to_arrow(records: Iterable[MundiRecord]):
+    """
+    Convert records to an Arrow table with typed columns: dates are UTC timestamps, sizes are integers and footprints
+    are WKB. The table can be written to Parquet with pyarrow.parquet.write_table
+
+    :param records: the MundiRecord instances
+    :return: a pyarrow.Table, one row per record
+    """
+    import pyarrow as pa
+
+    columns = records_to_columns(records)
+    types = {column: pa.string() for column in columns}
+    types.update({column: pa.timestamp('us', tz='UTC') for column in DATE_COLUMNS})
+    types.update({column: pa.int64() for column in INTEGER_COLUMNS})
+    types.update({column: pa.float64() for column in FLOAT_COLUMNS})
+    types['footprint'] = pa.binary()
+
+    return pa.table({column: pa.array(values, type=types[column]) for column, values in columns.items()})
+
+
+# --------------------------
+# FOOTPRINT INDEX
+# --------------------------
+class FootprintIndex:
+    """
+    Spatial index (STRtree) of records' footprints, to filter records by geometry without requesting the catalogue
+    again. Geometries are queried in bulk: a single call matches records against hundreds of AOIs (shapely >= 2 is
+    required)
+    """
+
+    def __init__(self, records: Iterable[MundiRecord]):
+        """
+        :param records: the MundiRecord instances. Records without footprint are ignored
+        """
+        import shapely
+
+        self.records = [record for record in records if record.footprint]
+        # shapely geometries of records' footprints, in the order of records
+        self.footprints = shapely.from_wkt([record.footprint for record in self.records])
+        self._tree = shapely.STRtree(self.footprints)
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _is_single(geoms) -> bool:
+        import shapely
+
+        return isinstance(geoms, (str, shapely.Geometry))
+
+    def _geometries(self, geoms):
+        import numpy as np
+        import shapely
+
+        # WKT strings (parsed at once) or shapely geometries
+        geoms = [geoms] if self._is_single(geoms) else list(geoms)
+        if all(isinstance(g, str) for g in geoms):
+            return shapely.from_wkt(geoms)
+        return np.array([shapely.from_wkt(g) if isinstance(g, str) else g for g in geoms], dtype=object)
+
+    def query_indices(self, geoms, predicate: str = 'intersects'):
+        """
+        Match records against geometries
+
+        :param geoms: the geometries (WKT strings or shapely geometries)
+        :param predicate: the predicate between geometries and footprints (see shapely.STRtree.query), eg "intersects",
+        "contains" (geometries containing footprints) or "within" (geometries within footprints)
+        :return: a 2 x N array of (geometry index, record index) pairs
+        """
+        return self._tree.query(self._geometries(geoms), predicate=predicate)
+
+    def query(self, geoms, predicate: str = 'intersects') -> List[List[MundiRecord]]:
+        """
+        Match records against geometries
+
+        :param geoms: the geometries (WKT strings or shapely geometries), or a single geometry
+        :param predicate: see query_indices
+        :return: the records matched by each geometry, or by the geometry if a single geometry is passed
+        """
+        geometries = self._geometries(geoms)
+        matches = [[] for _ in geometries]
+        for geometry_index, record_index in self._tree.query(geometries, predicate=predicate).T:
+            matches[geometry_index].append(self.records[record_index])
+        return matches[0] if self._is_single(geoms) else matches
+
+    def coverage(self, geoms) -> List[float]:
+        """
+        Fraction of the area of geometries covered by footprints
+
+        :param geoms: the geometries (WKT strings or shapely geometries)
+        :return: the fraction covered (between 0 and 1) of each geometry
+        """
+        import shapely
+
+        geometries = self._geometries(geoms)
+        matches = [[] for _ in geometries]
+        for geometry_index, record_index in self._tree.query(geometries, predicate='intersects').T:
+            matches[geometry_index].append(record_index)
+        covered = [shapely.intersection(geometry, shapely.union_all(self.footprints[indices]))
+                   for geometry, indices in zip(geometries, matches)]
+        areas = shapely.area(geometries)
+        return [float(shapely.area(c) / a) if a else 0. for c, a in zip(covered, areas)]
+
+
+# --------------------------
+# RESPONSE WRAPPER
+# --------------------------
+def _find_entries(response_wrapper: ResponseWrapper):
+    """
+    Find all atom:entry elements in a ResponseWrapper instance
+
+    :param response_wrapper: the ResponseWrapper instance
+    :return: a list of etree.Element whose tags are atom:entry
+    """
+    root_node = etree.fromstring(response_wrapper.read())
+    return root_node.findall('atom:entry', namespaces=MUNDI_NAMESPACES)
+
+
+def find_entries(response_wrappers: List[ResponseWrapper]):
+    """
+    Find all atom:entry elements in a list of ResponseWrappers
+
+    :param response_wrappers: the list of ResponseWrappers
+    :return: a list of etree.Element whose tags are atom:entry
+    """
+    entries = []
+    for rw in response_wrappers:
+        entries += _find_entries(rw)
+    return entries
+
+
+# For retro compatibility
+def findentries(ListResponseWrapper):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "find_entries" function instead')
+    return find_entries(ListResponseWrapper)
+
+
+# --------------------------
+# OPENSEARCH
+# --------------------------
+class OpenSearchDescription:
+    def __init__(self, opensearch_document_url: str, cache: DocumentCache = document_cache):
+        # root node of OS description document (cache is bypassed if None)
+        if cache is None:
+            self.root = etree.fromstring(open_url(opensearch_document_url, method='Get').read())
+        else:
+            self.root = etree.fromstring(cache.get(opensearch_document_url))
+
+    def xpath(self, query: str) -> List[etree.Element]:
+        return self.root.xpath(query, namespaces=MUNDI_NAMESPACES)
+
+    def find(self, query: str) -> etree.Element:
+        return self.root.find(query, namespaces=MUNDI_NAMESPACES)
+
+    def findall(self, query: str) -> List[etree.Element]:
+        return self.root.findall(query, namespaces=MUNDI_NAMESPACES)
+
+
+def _iter_opensearch_pages(collection, query='', data=None, method='Get', cookies=None, username=None, password=None,
+                           timeout=30, headers=None, verify=True, cert=None, params=None, max_workers=4):
+    """
+    Iterate over the pages of a given OpenSearch request. Each page is parsed only once. Once the first page has been
+    received, the following ones are requested concurrently (at most max_workers at a time) and yielded in order
+
+    :return: an iterator of (ResponseWrapper, root etree.Element) tuples, one per page
+    """
+    # if params is provided, query is ignored
+    if params is not None:
+        query = '&'.join(f'{k}={v}' for k, v in params.items())
+
+    # build base request URI
+    os_query_base = f'https://{collection.name}.browse.catalog.mundiwebservices.com/opensearch?{query}'
+
+    def get_page(start_index):
+        page = open_url(f'{os_query_base}&startIndex={start_index}', data, method, cookies, username, password,
+                       timeout, headers, verify, cert)
+        return page, etree.fromstring(page.read().strip())
+
+    # first page tells how many records are matched, and how many records a page holds
+    first_page, first_page_xml = get_page(1)
+    yield first_page, first_page_xml
+
+    nb_total = int(first_page_xml.find('os:totalResults', namespaces=MUNDI_NAMESPACES).text)
+    nb_page = int(first_page_xml.find('os:itemsPerPage', namespaces=MUNDI_NAMESPACES).text)
+    start_index = int(first_page_xml.find('os:startIndex', namespaces=MUNDI_NAMESPACES).text)
+    if nb_page == 0:
+        return
+
+    # loop through all other matched records
+    yield from ordered_map(get_page, range(start_index + nb_page, nb_total + 1, nb_page), max_workers)
+
+
+def iter_opensearch_entries(collection, params=None, query='', data=None, method='Get', cookies=None, username=None,
+                            password=None, timeout=30, headers=None, verify=True, cert=None, max_workers=4):
+    """
+    Iterate over the atom:entry elements matched by a given OpenSearch request. Only a few pages are requested ahead of
+    the entries being consumed: memory usage doesn't depend on the number of results, and breaking the loop stops the
+    requests
+
+    :param collection: the MundiCollection to search in
+    :param params: the OpenSearch parameters as a dict. If provided, query is ignored
+    :param query: the OpenSearch query string (eg, "productType=GRD&timeStart=2019-01-01")
+    :param max_workers: maximum number of pages requested concurrently. Defaults to 4
+    :return: an iterator of etree.Element whose tags are atom:entry
+    """
+    for _, page_xml in _iter_opensearch_pages(collection, query, data, method, cookies, username, password, timeout,
+                                              headers, verify, cert, params, max_workers):
+        yield from page_xml.iterfind('atom:entry', namespaces=MUNDI_NAMESPACES)
+
+
+def opensearch_query(collection, query='', data=None, method='Get', cookies=None, username=None, password=None,
+                     timeout=30, headers=None, verify=True, cert=None, params=None, max_workers=4):
+    """
+    Get a list of ResponseWrappers from a given OpenSearch request. Pages after the first one are requested
+    concurrently (at most max_workers at a time).
+    All pages are kept in memory: prefer iter_opensearch_entries for large requests
+    """
+    return [page for page, _ in _iter_opensearch_pages(collection, query, data, method, cookies, username, password,
+                                                       timeout, headers, verify, cert, params, max_workers)]
+
+
+def _iter_opensearch_record_chunks(collection, params, chunk_size, **kwargs):
+    # group OpenSearch entries, parsed as MundiRecord, by chunks of chunk_size
+    chunk = []
+    for entry in iter_opensearch_entries(collection, params, **kwargs):
+        chunk.append(MundiRecord.from_element(entry))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_opensearch_dataframes(collection, params=None, chunk_size=1000, **kwargs):
+    """
+    Iterate over the results of a given OpenSearch request as pandas DataFrames of at most chunk_size rows (see
+    records_to_dataframe). Only one chunk is held in memory at a time
+
+    :param collection: the MundiCollection to search in
+    :param params: the OpenSearch parameters as a dict
+    :param chunk_size: maximum number of rows per DataFrame. Defaults to 1000
+    :param kwargs: see iter_opensearch_entries
+    :return: an iterator of pandas.DataFrame
+    """
+    for chunk in _iter_opensearch_record_chunks(collection, params, chunk_size, **kwargs):
+        yield records_to_dataframe(chunk)
+
+
+def opensearch_to_parquet(collection, path: str, params=None, chunk_size=1000, **kwargs) -> int:
+    """
+    Write the results of a given OpenSearch request to a Parquet file, chunk by chunk (see records_to_arrow)
+
+    :param collection: the MundiCollection to search in
+    :param path: path of the Parquet file
+    :param params: the OpenSearch parameters as a dict
+    :param chunk_size: number of records written at a time. Defaults to 1000
+    :param kwargs: see iter_opensearch_entries
+    :return: the number of records written
+    """
+    import pyarrow.parquet as pq
+
+    nb_records = 0
+    writer = None
+    try:
+        for chunk in _iter_opensearch_record_chunks(collection, params, chunk_size, **kwargs):
+            table = records_to_arrow(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            nb_records += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return nb_records
+
+
+def opensearch_nb_results(collection, query="", data=None, method='Get', cookies=None, username=None,
+                          password=None, timeout=30, headers=None, verify=True, cert=None, params=None):
+    """Get the number of results from an OpenSearch request"""
+    # if params is provided, query is ignored
+    if params is not None:
+        query = '&'.join(f'{k}={v}' for k, v in params.items())
+
+    # build base request URI
+    os_query = f'https://{collection.name}.browse.catalog.mundiwebservices.com/opensearch?{query}'
+
+    # only get first page to read number of results
+    page = open_url(os_query, data, method, cookies, username, password, timeout, headers, verify, cert)
+    response_wrapper = page.read()
+    response_wrapper_xml = etree.fromstring(response_wrapper)
+
+    return int(response_wrapper_xml.find('os:totalResults', namespaces=MUNDI_NAMESPACES).text)
+
+
+# For retro compatibility
+def mundiopenURL2(col="", query="", data=None, method='Get', cookies=None, username=None, password=None, timeout=30,
+                  headers=None, verify=True, cert=None):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "opensearch_query" function instead')
+    return opensearch_query(col, query, data, method, cookies, username, password, timeout, headers, verify, cert)
+
+
+# --------------------------
+# RETRO COMPATIBILITY
+# --------------------------
+def width(bbox, height):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.height2width" function instead')
+    return utils.height2width(bbox, height)
+
+
+def height(bbox, width):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.width2height" function instead')
+    return utils.width2height(bbox, width)
+
+
+def polygon_bbox_country(country_name):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.country_polygon_bbox" function instead')
+    return utils.country_polygon_bbox(country_name)
+
+
+def display_polygon_country(country_name, a, color):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.display_country_on_world_map" function instead')
+    return utils.display_country_on_world_map(country_name, a, color)
+
+
+def polygon_bbox_city(city_name):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.city_polygon_bbox" function instead')
+    return utils.city_polygon_bbox(city_name)
+
+
+def display_city_wms(polygon, bbox, height, wms_layers, time):
+    logger.warning(
+        'This function will be removed in future versions of mundilib. In order to for you code to run with these '
+        'future versions, please consider using "utils.display_wms" function instead')
+    c = MundiCatalogue()
+    wms = c.get_collection('Sentinel2').mundi_wms('L1C')
+    return utils.display_wms(polygon, bbox, wms, wms_layers, time, height=512)
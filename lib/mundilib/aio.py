@@ -0,0 +1,322 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+"""
+Asynchronous (asyncio) clients of Mundi web services. Requires aiohttp.
+
+Many requests can be in flight from a single thread: the number of concurrent requests is bounded by the client's
+limiter. From synchronous code (including Jupyter cells), coroutines are run with run_sync, eg:
+
+    async def get_frames(dates):
+        async with AsyncMundiClient(max_concurrency=32) as client:
+            return await client.gather(client.get_map(url, "TRUE_COLOR", bbox, 512, 512, time=d) for d in dates)
+
+    frames = run_sync(get_frames(dates))
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+
+import aiohttp
+from lxml import etree
+
+from mundilib import MUNDI_NAMESPACES, MundiRecord, check_service_exception, get_records_payload, logger
+
+
+def run_sync(coroutine):
+    """
+    Run a coroutine to completion from synchronous code. If an event loop is already running in this thread (eg, in a
+    Jupyter kernel), the coroutine is run in its own event loop, in another thread
+
+    :param coroutine: the coroutine to run
+    :return: the result of the coroutine
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class AsyncMundiClient:
+    """
+    Asynchronous client of Mundi OGC and OpenSearch services. It must be used as an async context manager, which owns
+    the underlying HTTP connections:
+
+        async with AsyncMundiClient() as client:
+            image = await client.get_map(...)
+    """
+
+    def __init__(self, max_concurrency: int = 16, timeout: float = 30, limit_per_host: int = 0):
+        """
+        :param max_concurrency: maximum number of requests in flight at the same time
+        :param timeout: timeout (in seconds) of each request
+        :param limit_per_host: maximum number of connections per host (0 means no limit but max_concurrency)
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.limit_per_host = limit_per_host
+        self._limiter = None
+        self._session = None
+
+    async def __aenter__(self) -> AsyncMundiClient:
+        self._limiter = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.limit_per_host)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                              auto_decompress=True)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def fetch(self, url: str, params=None, data: str = None, method: str = 'GET') -> bytes:
+        """
+        Send a request, waiting for the limiter if max_concurrency requests are already in flight
+
+        :param url: the URL of the request
+        :param params: the query parameters, as a dict or a list of (name, value) tuples
+        :param data: the body of the request (POST)
+        :param method: the HTTP method
+        :return: the content of the response
+        """
+        if self._session is None:
+            raise RuntimeError("AsyncMundiClient must be used as an async context manager")
+
+        headers = {'Content-Type': 'text/xml'} if data is not None else None
+        async with self._limiter:
+            async with self._session.request(method, url, params=params, data=data, headers=headers) as response:
+                content = await response.read()
+                response.raise_for_status()
+                check_service_exception(content, response.content_type)
+                return content
+
+    @staticmethod
+    async def gather(coroutines: Iterable) -> List:
+        """
+        Run coroutines concurrently (bounded by the limiter of the client they use)
+
+        :param coroutines: the coroutines to run
+        :return: the list of their results, in order
+        """
+        return await asyncio.gather(*coroutines)
+
+    # --------------------------
+    # OPENSEARCH
+    # --------------------------
+    async def iter_opensearch_pages(self, collection, params: Dict = None, query: str = '',
+                                    prefetch: int = None) -> AsyncIterator[etree.Element]:
+        """
+        Iterate over the pages of an OpenSearch request. Once the first page has been received, the following ones are
+        requested concurrently (at most prefetch pages ahead of the consumer) and yielded in order
+
+        :param collection: the MundiCollection to search in
+        :param params: the OpenSearch parameters as a dict. If provided, query is ignored
+        :param query: the OpenSearch query string (eg, "productType=GRD&timeStart=2019-01-01")
+        :param prefetch: maximum number of pages requested ahead. Defaults to max_concurrency
+        :return: an async iterator of the root etree.Element of the pages
+        """
+        if params is not None:
+            query = '&'.join(f'{k}={v}' for k, v in params.items())
+        os_query_base = f'https://{collection.name}.browse.catalog.mundiwebservices.com/opensearch?{query}'
+
+        async def get_page(start_index):
+            content = await self.fetch(f'{os_query_base}&startIndex={start_index}')
+            return etree.fromstring(content.strip())
+
+        first_page = await get_page(1)
+        yield first_page
+
+        nb_total = int(first_page.find('os:totalResults', namespaces=MUNDI_NAMESPACES).text)
+        nb_page = int(first_page.find('os:itemsPerPage', namespaces=MUNDI_NAMESPACES).text)
+        start_index = int(first_page.find('os:startIndex', namespaces=MUNDI_NAMESPACES).text)
+        if nb_page == 0:
+            return
+
+        async for page in self._ordered(get_page, range(start_index + nb_page, nb_total + 1, nb_page), prefetch):
+            yield page
+
+    async def iter_opensearch_entries(self, collection, params: Dict = None, query: str = '',
+                                      prefetch: int = None) -> AsyncIterator[etree.Element]:
+        """
+        Iterate over the atom:entry elements matched by an OpenSearch request (see iter_opensearch_pages)
+
+        :return: an async iterator of etree.Element whose tags are atom:entry
+        """
+        async for page in self.iter_opensearch_pages(collection, params, query, prefetch):
+            for entry in page.iterfind('atom:entry', namespaces=MUNDI_NAMESPACES):
+                yield entry
+
+    # --------------------------
+    # CSW
+    # --------------------------
+    async def get_records(self, csw_url: str, cql_filter: str = None, max_records: int = None,
+                          page_size: int = 50) -> List[MundiRecord]:
+        """
+        Get the records matched by a CSW GetRecords request. Once the first page has been received, the following ones
+        are requested concurrently
+
+        :param csw_url: the CSW endpoint (eg, MundiCollection.csw_endpoint)
+        :param cql_filter: a CQL filter, XML escaped (eg, "DIAS:sensingStartDate &gt; '2019-01-01'")
+        :param max_records: maximum number of records to get. If None, all matched records are got
+        :param page_size: number of records per page
+        :return: the list of MundiRecord
+        """
+        payload_xml = etree.fromstring(get_records_payload(cql_filter, page_size))
+
+        async def get_page(start_position):
+            payload_xml.set('startPosition', str(start_position))
+            content = await self.fetch(csw_url, data=etree.tostring(payload_xml, encoding='unicode'), method='POST')
+            return etree.fromstring(content).find('csw:SearchResults', namespaces=MUNDI_NAMESPACES)
+
+        first_page = await get_page(1)
+        nb_matched = int(first_page.get('numberOfRecordsMatched'))
+        if max_records is not None:
+            nb_matched = min(nb_matched, max_records)
+
+        pages = [first_page] + await self.gather(get_page(position)
+                                                 for position in range(1 + page_size, nb_matched + 1, page_size))
+        records = [MundiRecord.from_element(element) for page in pages for element in page]
+        logger.debug(f"{len(records)} records got from {csw_url} in {len(pages)} pages")
+        return records[:nb_matched]
+
+    # --------------------------
+    # WMS / WCS / WMTS
+    # --------------------------
+    async def get_map(self, wms_url: str, layers: str, bbox: Tuple[float, float, float, float], width: int,
+                      height: int, srs: str = 'EPSG:4326', image_format: str = 'image/png', time: str = None,
+                      version: str = '1.3.0', styles: str = '', **kwargs) -> bytes:
+        """
+        Send a WMS GetMap request
+
+        :param wms_url: the WMS endpoint (eg, the url of MundiCollection.mundi_wms(dataset))
+        :param layers: the layer(s), comma separated
+        :param bbox: the bounding box, in the axis order of srs and version (as with owslib)
+        :param width: width of the image, in pixels
+        :param height: height of the image, in pixels
+        :param srs: the CRS of bbox
+        :param image_format: the format of the image
+        :param time: the time dimension (eg, "2019-01-01/2019-01-31")
+        :param version: WMS version
+        :param styles: the style(s), comma separated
+        :param kwargs: any other (vendor) parameter, eg MAXCC=10
+        :return: the image, as bytes
+        """
+        params = self._wms_params('GetMap', layers, bbox, width, height, srs, time, version, styles)
+        params.update({'FORMAT': image_format, 'TRANSPARENT': 'TRUE'})
+        params.update({k.upper(): v for k, v in kwargs.items()})
+        return await self.fetch(wms_url, params=params)
+
+    async def get_feature_info(self, wms_url: str, layers: str, bbox: Tuple[float, float, float, float], width: int,
+                               height: int, i: int, j: int, srs: str = 'EPSG:4326',
+                               info_format: str = 'application/json', time: str = None, version: str = '1.3.0',
+                               feature_count: int = 1, **kwargs) -> bytes:
+        """
+        Send a WMS GetFeatureInfo request (see get_map for common parameters)
+
+        :param i: column of the queried pixel
+        :param j: row of the queried pixel
+        :param info_format: the format of the response
+        :param feature_count: maximum number of features returned
+        :return: the content of the response
+        """
+        params = self._wms_params('GetFeatureInfo', layers, bbox, width, height, srs, time, version, '')
+        pixel_names = ('I', 'J') if version == '1.3.0' else ('X', 'Y')
+        params.update({'QUERY_LAYERS': layers, 'INFO_FORMAT': info_format, 'FEATURE_COUNT': feature_count,
+                       pixel_names[0]: i, pixel_names[1]: j})
+        params.update({k.upper(): v for k, v in kwargs.items()})
+        return await self.fetch(wms_url, params=params)
+
+    @staticmethod
+    def _wms_params(request, layers, bbox, width, height, srs, time, version, styles) -> Dict:
+        params = {'SERVICE': 'WMS', 'REQUEST': request, 'VERSION': version, 'LAYERS': layers, 'STYLES': styles,
+                  'WIDTH': width, 'HEIGHT': height, 'BBOX': ','.join(str(x) for x in bbox),
+                  'CRS' if version == '1.3.0' else 'SRS': srs}
+        if time is not None:
+            params['TIME'] = time
+        return params
+
+    async def get_coverage(self, wcs_url: str, coverage: str, bbox: Tuple[float, float, float, float],
+                           width: int = None, height: int = None, resx: str = None, resy: str = None,
+                           crs: str = 'EPSG:4326', coverage_format: str = 'image/tiff', time: str = None,
+                           **kwargs) -> bytes:
+        """
+        Send a WCS 1.0.0 GetCoverage request (as OWSLib's getCoverage does for MundiCollection.mundi_wcs). The size of
+        the coverage is set either by width and height, or by resx and resy
+
+        :param wcs_url: the WCS endpoint (eg, the url of MundiCollection.mundi_wcs(dataset))
+        :param coverage: the coverage (eg, "B8A")
+        :param bbox: the bounding box, in crs units
+        :param width: width of the coverage, in pixels
+        :param height: height of the coverage, in pixels
+        :param resx: resolution along x (eg, "10m")
+        :param resy: resolution along y
+        :param crs: the CRS of bbox
+        :param coverage_format: the format of the coverage
+        :param time: the time (eg, "2019-01-01T00:00:00.0")
+        :param kwargs: any other (vendor) parameter, eg SHOWLOGO="false"
+        :return: the coverage, as bytes
+        """
+        if (width is None or height is None) and (resx is None or resy is None):
+            raise ValueError("Either width and height, or resx and resy, are required")
+        params = {'SERVICE': 'WCS', 'REQUEST': 'GetCoverage', 'VERSION': '1.0.0', 'COVERAGE': coverage, 'CRS': crs,
+                  'BBOX': ','.join(str(x) for x in bbox), 'FORMAT': coverage_format}
+        if width is not None and height is not None:
+            params.update({'WIDTH': width, 'HEIGHT': height})
+        else:
+            params.update({'RESX': resx, 'RESY': resy})
+        if time is not None:
+            params['TIME'] = time
+        params.update({k.upper(): v for k, v in kwargs.items()})
+        return await self.fetch(wcs_url, params=params)
+
+    async def get_tile(self, wmts_url: str, layer: str, tile_matrix_set: str, tile_matrix: str, row: int, column: int,
+                       image_format: str = 'image/png', style: str = 'default', version: str = '1.0.0',
+                       **kwargs) -> bytes:
+        """
+        Send a WMTS GetTile request (KVP encoding)
+
+        :param wmts_url: the WMTS endpoint (eg, the url of MundiCollection.mundi_wmts(dataset))
+        :param layer: the layer
+        :param tile_matrix_set: the tile matrix set (eg, "PopularWebMercator256")
+        :param tile_matrix: the tile matrix (ie, zoom level)
+        :param row: the row of the tile
+        :param column: the column of the tile
+        :param image_format: the format of the tile
+        :param style: the style
+        :param version: WMTS version
+        :param kwargs: any other (vendor or dimension) parameter, eg TIME="2019-01-01"
+        :return: the tile, as bytes
+        """
+        params = {'SERVICE': 'WMTS', 'REQUEST': 'GetTile', 'VERSION': version, 'LAYER': layer, 'STYLE': style,
+                  'FORMAT': image_format, 'TILEMATRIXSET': tile_matrix_set, 'TILEMATRIX': tile_matrix,
+                  'TILEROW': row, 'TILECOL': column}
+        params.update({k.upper(): v for k, v in kwargs.items()})
+        return await self.fetch(wmts_url, params=params)
+
+    async def _ordered(self, function, items: Iterable, prefetch: int = None):
+        # asyncio counterpart of mundilib.ordered_map: a bounded number of calls are run ahead of the consumer
+        prefetch = prefetch or self.max_concurrency
+        tasks = deque()
+        try:
+            for item in items:
+                tasks.append(asyncio.ensure_future(function(item)))
+                if len(tasks) > prefetch:
+                    yield await tasks.popleft()
+            while tasks:
+                yield await tasks.popleft()
+        finally:
+            for task in tasks:
+                task.cancel()
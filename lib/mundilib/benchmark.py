@@ -0,0 +1,376 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+"""
+Benchmarks of mundilib and the notebook libraries, run offline against a recording (see mundilib.replay).
+
+The benchmarks to run are listed in the "benchmarks.json" file of the recording, eg:
+
+    [
+        {"name": "csw-500", "benchmark": "get_records", "kwargs": {"collection": "Sentinel2", "maxrecords": 500}},
+        {"name": "gif-10", "benchmark": "giflib_download_images",
+         "kwargs": {"bbox": [1.3, 43.5, 1.5, 43.7], "collection": ["Sentinel2", "L1C"], "layer": "TRUE_COLOR",
+                    "start_date": "2019-01-01", "stop_date": "2019-03-01", "delta_days": 6}}
+    ]
+
+Run them (the notebook libraries, ie lib/internal_lib, must be importable), and compare them to a previous run:
+
+    python -m mundilib.benchmark recordings/s2 --latency 0.05 --bandwidth 10485760 --baseline baseline.json
+
+The benchmarks of a recording can also be run by pytest-benchmark, eg in a test file of a project using mundilib:
+
+    @pytest.mark.parametrize("name", pytest_benchmark_cases("recordings/s2"))
+    def test_mundilib(benchmark, name):
+        run_pytest_benchmark(benchmark, "recordings/s2", name, latency=0.05)
+
+Import times of mundilib, utils and the notebook libraries (each imported in a new interpreter) can also be checked
+against a budget (see IMPORT_BUDGETS):
+
+    python -m mundilib.benchmark --imports
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date
+from os.path import abspath, dirname, join
+from typing import Any, Callable, Dict, List
+
+from mundilib import MundiCatalogue, MundiDownloader, document_cache, opensearch_query, service_cache
+from mundilib.replay import ReplayServer
+
+# font shipped with the notebook libraries (their default font path only exists on Mundi Jupyter)
+FONT_PATH = join(dirname(dirname(__file__)), "dependencies", "fonts", "poppins-light.ttf")
+
+# folders of mundilib and of the notebook libraries
+LIB_FOLDERS = [abspath(dirname(dirname(__file__))), abspath(join(dirname(dirname(__file__)), "internal_lib"))]
+
+# import time budgets, in seconds. The notebook libraries import their plotting and widget dependencies when imported
+IMPORT_BUDGETS = {
+    "mundilib": 0.5,
+    "utils": 0.05,
+    "giflib": 3.,
+    "imglib": 3.,
+    "waterlib": 3.,
+    "sentinel3lib": 3.,
+    "camslib": 5.,
+    "cmemslib": 5.,
+}
+
+
+# --------------------------
+# BENCHMARKS
+# --------------------------
+def bench_get_records(server: ReplayServer, collection: str = "Sentinel2", maxrecords: int = 500, max_workers: int = 4,
+                      **kwargs) -> int:
+    """CSW GetRecords of a collection (see MundiCSW.get_records). Returns the number of records"""
+    csw = MundiCatalogue().get_collection(collection).mundi_csw()
+    csw.get_records(maxrecords=maxrecords, max_workers=max_workers, **kwargs)
+    return len(csw.mundi_records)
+
+
+def bench_opensearch_query(server: ReplayServer, collection: str = "Sentinel2", params: Dict[str, Any] = None,
+                           max_workers: int = 4) -> int:
+    """OpenSearch request over all pages (see opensearch_query). Returns the number of pages"""
+    return len(opensearch_query(MundiCatalogue().get_collection(collection), params=params or {},
+                                max_workers=max_workers))
+
+
+def bench_download(server: ReplayServer, collection: str = "Sentinel2", browse: Dict[str, Any] = None,
+                   max_workers: int = 4, **kwargs) -> int:
+    """
+    Browse a collection, then download the products found from the recorded object storage
+    (see MundiDownloader.download). Returns the number of bytes transferred
+    """
+    downloader = MundiDownloader(MundiCatalogue().get_collection(collection), "replay", "replay",
+                                 endpoint_url=server.url)
+    downloader.browse(**(browse or {}))
+    with tempfile.TemporaryDirectory() as target_folder:
+        return downloader.download(target_folder, max_workers=max_workers, resume=False, **kwargs)
+
+
+def bench_giflib_download_images(server: ReplayServer, bbox: List[float], collection: List[str], layer: str,
+                                 start_date: str, stop_date: str, delta_days: int = 6, height: int = 512,
+                                 width: int = 512, title: str = "Benchmark", subtitle: str = "", maxCC=None) -> int:
+    """Frames of a GIF (see giflib.download_images). Returns the number of frames"""
+    import giflib
+
+    with tempfile.TemporaryDirectory() as folder:
+        giflib.SAVE_FOLDER_IMAGES, giflib.TTF_PATH = f"{folder}/", FONT_PATH
+        giflib.download_images(bbox, tuple(collection), layer, date.fromisoformat(start_date),
+                               date.fromisoformat(stop_date), title, subtitle, delta_days, height, width, maxCC)
+        return len(giflib.glob.glob(f"{folder}/*.png"))
+
+
+def bench_camslib_download_images(server: ReplayServer, grib_file: str, projection: str = "EUROPE",
+                                  color_map: str = "jet", image_title: str = "Benchmark") -> int:
+    """Images of the messages of a GRIB file (see camslib.download_images). Returns the number of images"""
+    import camslib
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        camslib.download_images(grib_file, output_dir, projection, color_map, image_title, "benchmark.gif")
+        return len(camslib.glob.glob(f"{output_dir}/*.png"))
+
+
+# benchmarks by name
+BENCHMARKS: Dict[str, Callable] = {
+    "get_records": bench_get_records,
+    "opensearch_query": bench_opensearch_query,
+    "download": bench_download,
+    "giflib_download_images": bench_giflib_download_images,
+    "camslib_download_images": bench_camslib_download_images,
+}
+
+
+# --------------------------
+# MEASURES
+# --------------------------
+def measure(function: Callable, server: ReplayServer, rounds: int = 3, cold: bool = True,
+            **kwargs) -> Dict[str, Any]:
+    """
+    Run a benchmark several times, measuring its duration, its memory peak and the requests it sends
+
+    :param function: the benchmark
+    :param server: the replay server
+    :param rounds: number of runs
+    :param cold: if True (default), caches (capabilities, catalogue documents) are cleared before each run (run_suite
+    caches documents in a temporary folder)
+    :param kwargs: arguments of the benchmark
+    :return: a dict of measures (durations are in seconds, memory peak - of Python allocations - in bytes)
+    """
+    durations, peaks, requests, transferred, result = [], [], [], [], None
+    for _ in range(rounds):
+        if cold:
+            document_cache.clear()
+            service_cache.clear()
+        stats = server.stats
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = function(server, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        requests.append(server.stats["requests"] - stats["requests"])
+        transferred.append(server.stats["bytes"] - stats["bytes"])
+
+    return {"median": statistics.median(durations), "min": min(durations), "max": max(durations),
+            "peak_memory": max(peaks), "requests": max(requests), "bytes": max(transferred), "rounds": rounds,
+            "result": result}
+
+
+def run_suite(folder: str, latency: float = 0., bandwidth: float = None, rounds: int = 3,
+              names: List[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the benchmarks of a recording (see module documentation) against a replay server
+
+    :param folder: the folder of the recording
+    :param latency: latency (in seconds) of the replay server
+    :param bandwidth: bandwidth (in bytes per second) of the replay server. If None, no limit
+    :param rounds: number of runs of each benchmark
+    :param names: names of the benchmarks to run. If None, all benchmarks are run
+    :return: the measures of each benchmark, by name
+    """
+    results = {}
+    with _replay(folder, latency, bandwidth) as server:
+        for entry in load_suite(folder):
+            if names is not None and entry["name"] not in names:
+                continue
+            results[entry["name"]] = measure(BENCHMARKS[entry["benchmark"]], server, rounds, **entry.get("kwargs", {}))
+    return results
+
+
+def load_suite(folder: str) -> List[Dict[str, Any]]:
+    """Get the benchmarks of a recording, as listed in its "benchmarks.json" file (see module documentation)"""
+    with open(join(folder, "benchmarks.json")) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _replay(folder: str, latency: float = 0., bandwidth: float = None):
+    # replay server of a recording, installed; catalogue documents are cached in a temporary folder, not to clear the
+    # user's cache
+    cache_folder = document_cache.folder
+    try:
+        with tempfile.TemporaryDirectory() as document_cache.folder, \
+                ReplayServer(folder, latency, bandwidth) as server, server.install():
+            yield server
+    finally:
+        document_cache.folder = cache_folder
+
+
+def pytest_benchmark_cases(folder: str) -> List[str]:
+    """
+    Get the names of the benchmarks of a recording, eg to parametrize a pytest-benchmark test (see run_pytest_benchmark)
+
+    :param folder: the folder of the recording
+    :return: the names of the benchmarks
+    """
+    return [entry["name"] for entry in load_suite(folder)]
+
+
+def run_pytest_benchmark(benchmark, folder: str, name: str, latency: float = 0., bandwidth: float = None,
+                         rounds: int = 3, cold: bool = True):
+    """
+    Run a benchmark of a recording with the "benchmark" fixture of pytest-benchmark. Requests and bytes sent by the
+    replay server are added to the extra info of the benchmark
+
+    :param benchmark: the pytest-benchmark fixture
+    :param folder: the folder of the recording
+    :param name: the name of the benchmark (see pytest_benchmark_cases)
+    :param latency: latency (in seconds) of the replay server
+    :param bandwidth: bandwidth (in bytes per second) of the replay server. If None, no limit
+    :param rounds: number of runs
+    :param cold: if True (default), caches (capabilities, catalogue documents) are cleared before each run
+    :return: the result of the last run
+    """
+    entry = next((e for e in load_suite(folder) if e["name"] == name), None)
+    if entry is None:
+        raise KeyError(f"No benchmark named {name!r} in {folder}")
+
+    def clear_caches():
+        if cold:
+            document_cache.clear()
+            service_cache.clear()
+
+    with _replay(folder, latency, bandwidth) as server:
+        stats = server.stats
+        result = benchmark.pedantic(BENCHMARKS[entry["benchmark"]], args=(server,), kwargs=entry.get("kwargs", {}),
+                                    setup=clear_caches, rounds=rounds)
+        benchmark.extra_info.update({key: (server.stats[key] - stats[key]) // rounds for key in stats})
+    return result
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     tolerance: float = 0.2) -> List[str]:
+    """
+    Compare measures to a baseline (eg, measures of the previous version)
+
+    :param results: the measures, as returned by run_suite
+    :param baseline: the baseline measures
+    :param tolerance: relative increase of duration, memory peak or requests above which it is a regression
+    :return: a message per regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for measure_name in ["median", "peak_memory", "requests"]:
+            reference = baseline[name][measure_name]
+            if reference and result[measure_name] > reference * (1 + tolerance):
+                regressions.append(f"{name}: {measure_name} {result[measure_name]:.6g} vs {reference:.6g} "
+                                   f"(+{100 * (result[measure_name] / reference - 1):.0f}%)")
+    return regressions
+
+
+def format_results(results: Dict[str, Dict[str, Any]]) -> str:
+    """Format measures as a table"""
+    lines = [f"{'benchmark':<30}{'median (s)':>12}{'min (s)':>10}{'peak (MB)':>11}{'requests':>10}{'MB':>10}"]
+    for name, r in results.items():
+        lines.append(f"{name:<30}{r['median']:>12.3f}{r['min']:>10.3f}{r['peak_memory'] / 1024 ** 2:>11.1f}"
+                     f"{r['requests']:>10}{r['bytes'] / 1024 ** 2:>10.1f}")
+    return "\n".join(lines)
+
+
+# --------------------------
+# IMPORT TIMES
+# --------------------------
+def measure_import(module: str, rounds: int = 3) -> float:
+    """
+    Measure the time needed to import a module in a new interpreter (mundilib and notebook libraries are importable)
+
+    :param module: the module name
+    :param rounds: number of imports
+    :return: the median import time, in seconds
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(LIB_FOLDERS + [os.environ.get("PYTHONPATH", "")]))
+    durations = [float(subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True,
+                                      text=True).stdout) for _ in range(rounds)]
+    return statistics.median(durations)
+
+
+def check_import_budgets(budgets: Dict[str, float] = None, rounds: int = 3) -> Dict[str, Any]:
+    """
+    Check import times against budgets. Modules which can't be imported (eg, missing dependency) are not measured, and
+    fail the check
+
+    :param budgets: import time budgets by module name, in seconds. Defaults to IMPORT_BUDGETS
+    :param rounds: number of imports of each module
+    :return: a dict of {module: import time}, None for modules which can't be imported, and "failures", a message
+    per module over budget or which can't be imported
+    """
+    results, failures = {}, []
+    for module, budget in (budgets or IMPORT_BUDGETS).items():
+        try:
+            results[module] = measure_import(module, rounds)
+        except subprocess.CalledProcessError as e:
+            results[module] = None
+            error = e.stderr.strip().splitlines()[-1] if e.stderr.strip() else f"exit status {e.returncode}"
+            failures.append(f"{module}: can't be imported ({error})")
+            continue
+        if results[module] > budget:
+            failures.append(f"{module}: imported in {results[module]:.3f}s, budget is {budget:.3f}s")
+    results["failures"] = failures
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run mundilib benchmarks against a recording")
+    parser.add_argument("recording", nargs="?", help="folder of the recording")
+    parser.add_argument("--imports", action="store_true",
+                        help="check import times against budgets instead: modules over budget, or which can't be "
+                             "imported, make the command fail")
+    parser.add_argument("--latency", type=float, default=0., help="latency of each request, in seconds")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bandwidth, in bytes per second")
+    parser.add_argument("--rounds", type=int, default=3, help="number of runs of each benchmark")
+    parser.add_argument("--only", nargs="*", default=None, help="names of the benchmarks to run")
+    parser.add_argument("--save", help="JSON file in which measures are saved")
+    parser.add_argument("--baseline", help="JSON file of baseline measures: regressions make the command fail")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative tolerance of regressions")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        results = check_import_budgets(rounds=args.rounds)
+        for module, duration in results.items():
+            if module != "failures":
+                print(f"{module:<30}{'-' if duration is None else f'{duration:.3f}':>12}")
+        for message in results["failures"]:
+            print(f"FAILED {message}")
+        return 1 if results["failures"] else 0
+    if args.recording is None:
+        parser.error("the folder of the recording is required")
+
+    results = run_suite(args.recording, args.latency, args.bandwidth, args.rounds, args.only)
+    print(format_results(results))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, default=str)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
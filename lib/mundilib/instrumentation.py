@@ -0,0 +1,389 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+"""
+Instrumentation of mundilib: hooks called around each request, spans timing the stages of a processing, and statistics
+aggregated from both.
+
+    @on_request_end
+    def log_slow_requests(request):
+        if request.duration > 1:
+            print(request.url_template, request.duration)
+
+    with span("gif"):
+        giflib.download_images(...)
+
+    print(stats.summary())
+    open("metrics.prom", "w").write(stats.to_prometheus())
+
+Requests sent through the shared session (get_session), catalogue and capabilities caches and S3 clients of
+MundiDownloader are instrumented.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger("mundilib")
+
+# path segments replaced by "{id}" in URL templates (collection IDs, UUIDs, numbers)
+ID_SEGMENT = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+)$", re.IGNORECASE)
+
+# query parameters kept in URL templates (OGC service and operation)
+TEMPLATE_PARAMETERS = ["service", "request"]
+
+# number of durations kept (per request template or span name) to compute percentiles
+PERCENTILE_WINDOW = 1000
+
+
+def url_template(method: str, url: str) -> str:
+    """
+    Template of a URL, grouping requests of the same kind: "GET shservices.mundiwebservices.com/ogc/wms/{id} WMS GetMap"
+
+    :param method: the HTTP method
+    :param url: the URL
+    :return: the template
+    """
+    parts = urlsplit(url)
+    path = "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in parts.path.split("/"))
+    params = {k.lower(): v for k, v in parse_qsl(parts.query)}
+    operation = " ".join(params[name] for name in TEMPLATE_PARAMETERS if name in params)
+    return f"{method.upper()} {parts.netloc}{path}{' ' if operation else ''}{operation}"
+
+
+class RequestInfo:
+    """
+    A request, as passed to hooks. Its status, bytes, retries, duration and error are set once it has ended
+    """
+
+    __slots__ = ("method", "url", "url_template", "cache", "status", "bytes", "retries", "start", "duration", "error")
+
+    def __init__(self, method: str, url: str, template: str = None, cache: str = None):
+        self.method = method.upper()
+        self.url = url
+        self.url_template = template or url_template(method, url)
+        # None if no cache is involved, otherwise "hit", "miss" or "revalidated"
+        self.cache = cache
+        self.status = None
+        self.bytes = 0
+        self.retries = 0
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return f"RequestInfo({self.method} {self.url}, status={self.status}, duration={self.duration})"
+
+
+class SpanInfo:
+    """A span (a timed stage of a processing), as passed to hooks"""
+
+    __slots__ = ("name", "parent", "attributes", "start", "duration", "error")
+
+    def __init__(self, name: str, parent: SpanInfo = None, attributes: Dict = None):
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    @property
+    def path(self) -> str:
+        """Names of the enclosing spans and of this span, eg "gif/frame/getmap\""""
+        return self.name if self.parent is None else f"{self.parent.path}/{self.name}"
+
+
+# --------------------------
+# HOOKS
+# --------------------------
+_hooks: Dict[str, List[Callable]] = {"request_start": [], "request_end": [], "span_end": []}
+
+# attributes of the requests sent in the current context (see request_context) and current span
+_request_context: ContextVar[Dict] = ContextVar("mundilib_request_context", default={})
+_current_span: ContextVar[SpanInfo] = ContextVar("mundilib_span", default=None)
+
+
+def _register(event: str, callback: Callable) -> Callable:
+    _hooks[event].append(callback)
+    return callback
+
+
+def on_request_start(callback: Callable[[RequestInfo], None]) -> Callable:
+    """Register a function called (with a RequestInfo) before each request. Can be used as a decorator"""
+    return _register("request_start", callback)
+
+
+def on_request_end(callback: Callable[[RequestInfo], None]) -> Callable:
+    """Register a function called (with a RequestInfo) after each request, failed or not. Can be used as a decorator"""
+    return _register("request_end", callback)
+
+
+def on_span_end(callback: Callable[[SpanInfo], None]) -> Callable:
+    """Register a function called (with a SpanInfo) at the end of each span. Can be used as a decorator"""
+    return _register("span_end", callback)
+
+
+def remove_hook(callback: Callable):
+    """Unregister a function registered with on_request_start, on_request_end or on_span_end"""
+    for callbacks in _hooks.values():
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+
+def _emit(event: str, info):
+    for callback in list(_hooks[event]):
+        try:
+            callback(info)
+        except Exception as e:
+            # instrumentation must never break requests
+            logger.warning(f"Instrumentation hook {callback} failed: {e}")
+
+
+# --------------------------
+# REQUESTS & SPANS
+# --------------------------
+@contextmanager
+def request_context(**attributes):
+    """Set attributes (eg, cache="miss") of the requests instrumented in this context"""
+    token = _request_context.set({**_request_context.get(), **attributes})
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+@contextmanager
+def instrument_request(method: str, url: str, template: str = None, cache: str = None):
+    """
+    Instrument a request: hooks are called before and after it
+
+    :param method: the HTTP method (or any operation name)
+    :param url: the URL
+    :param template: the URL template. Defaults to url_template(method, url)
+    :param cache: the cache status, if a cache is involved ("hit", "miss" or "revalidated")
+    :return: a context manager yielding the RequestInfo, whose status, bytes and retries are to be set
+    """
+    info = RequestInfo(method, url, template, cache)
+    for name, value in _request_context.get().items():
+        setattr(info, name, value)
+    _emit("request_start", info)
+    start = time.perf_counter()
+    try:
+        yield info
+    except BaseException as e:
+        info.error = repr(e)
+        raise
+    finally:
+        info.duration = time.perf_counter() - start
+        _emit("request_end", info)
+
+
+def record_cache_hit(url: str, template: str = None):
+    """Instrument a request served from a cache (without network)"""
+    with instrument_request("GET", url, template, cache="hit"):
+        pass
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage of a processing. Spans can be nested
+
+    :param name: the name of the stage, eg "getmap"
+    :param attributes: any attribute of the span, passed to hooks
+    :return: a context manager yielding the SpanInfo
+    """
+    info = SpanInfo(name, _current_span.get(), attributes)
+    token = _current_span.set(info)
+    start = time.perf_counter()
+    try:
+        yield info
+    except BaseException as e:
+        info.error = repr(e)
+        raise
+    finally:
+        info.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _emit("span_end", info)
+
+
+def instrument_s3_client(s3_client):
+    """
+    Instrument the requests of a boto3 S3 client (one event per operation, retries included)
+
+    :param s3_client: the boto3 S3 client
+    """
+    requests = threading.local()
+
+    def before_call(model, params, **kwargs):
+        url = f"s3://{params.get('Bucket', '')}/{params.get('Key', '')}"
+        requests.context = instrument_request(model.name, url, template=f"S3 {model.name}")
+        requests.info = requests.context.__enter__()
+
+    def after_call(http_response, parsed, **kwargs):
+        context = getattr(requests, "context", None)
+        if context is None:
+            return
+        info = requests.info
+        info.status = http_response.status_code
+        info.bytes = int(http_response.headers.get("Content-Length", 0))
+        info.retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        requests.context = None
+        context.__exit__(None, None, None)
+
+    def after_call_error(exception, **kwargs):
+        context = getattr(requests, "context", None)
+        if context is None:
+            return
+        requests.context = None
+        context.__exit__(type(exception), exception, None)
+
+    s3_client.meta.events.register("before-call.s3", before_call)
+    s3_client.meta.events.register("after-call.s3", after_call)
+    s3_client.meta.events.register("after-call-error.s3", after_call_error)
+
+
+# --------------------------
+# STATISTICS
+# --------------------------
+class _Aggregate:
+    # statistics of a request template or span name
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.
+        self.max = 0.
+        self.bytes = 0
+        self.retries = 0
+        self.cache = {"hit": 0, "miss": 0, "revalidated": 0}
+        self.durations = deque(maxlen=PERCENTILE_WINDOW)
+
+    def add(self, duration: float, error: bool, nb_bytes: int = 0, retries: int = 0, cache: str = None):
+        self.count += 1
+        self.errors += int(error)
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.bytes += nb_bytes or 0
+        self.retries += retries or 0
+        if cache in self.cache:
+            self.cache[cache] += 1
+        self.durations.append(duration)
+
+    def percentile(self, q: float) -> float:
+        durations = sorted(self.durations)
+        return durations[min(int(q * len(durations)), len(durations) - 1)] if durations else 0.
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "errors": self.errors, "total": self.total,
+                "mean": self.total / self.count if self.count else 0., "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95), "max": self.max, "bytes": self.bytes, "retries": self.retries,
+                "cache": dict(self.cache)}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Stats:
+    """
+    Statistics of requests (by URL template) and spans (by path), fed by hooks
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, _Aggregate] = {}
+        self.spans: Dict[str, _Aggregate] = {}
+
+    def record_request(self, info: RequestInfo):
+        with self._lock:
+            self.requests.setdefault(info.url_template, _Aggregate()).add(
+                info.duration, info.error is not None or (info.status or 0) >= 400, info.bytes, info.retries,
+                info.cache)
+
+    def record_span(self, info: SpanInfo):
+        with self._lock:
+            self.spans.setdefault(info.path, _Aggregate()).add(info.duration, info.error is not None)
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.spans.clear()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"requests": {k: v.to_dict() for k, v in self.requests.items()},
+                    "spans": {k: v.to_dict() for k, v in self.spans.items()}}
+
+    def to_json(self, **kwargs) -> str:
+        """Statistics as JSON (kwargs are passed to json.dumps)"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def summary(self) -> str:
+        """Statistics as a table, slowest (in total) first"""
+        stats = self.to_dict()
+        lines = [f"{'':<70}{'count':>7}{'err':>5}{'total s':>9}{'p50 ms':>8}{'p95 ms':>8}{'MB':>8}{'retry':>6}"
+                 f"{'hit/miss':>10}"]
+        for kind in ["requests", "spans"]:
+            for name, s in sorted(stats[kind].items(), key=lambda item: -item[1]["total"]):
+                cache = f"{s['cache']['hit']}/{s['cache']['miss'] + s['cache']['revalidated']}" \
+                    if any(s["cache"].values()) else ""
+                lines.append(f"{name[:69]:<70}{s['count']:>7}{s['errors']:>5}{s['total']:>9.2f}"
+                             f"{1000 * s['p50']:>8.0f}{1000 * s['p95']:>8.0f}{s['bytes'] / 1024 ** 2:>8.1f}"
+                             f"{s['retries']:>6}{cache:>10}")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix: str = "mundilib") -> str:
+        """Statistics in Prometheus text exposition format"""
+        stats = self.to_dict()
+        metrics = [
+            ("requests", "template", "requests_total", "counter", "Requests sent", lambda s: s["count"]),
+            ("requests", "template", "request_errors_total", "counter", "Failed requests", lambda s: s["errors"]),
+            ("requests", "template", "request_bytes_total", "counter", "Bytes received", lambda s: s["bytes"]),
+            ("requests", "template", "request_retries_total", "counter", "Retries", lambda s: s["retries"]),
+            ("requests", "template", "cache_hits_total", "counter", "Requests served from a cache",
+             lambda s: s["cache"]["hit"]),
+            ("requests", "template", "cache_misses_total", "counter", "Requests not (or stale) in a cache",
+             lambda s: s["cache"]["miss"] + s["cache"]["revalidated"]),
+            ("spans", "span", "spans_total", "counter", "Spans", lambda s: s["count"]),
+        ]
+        lines = []
+        for kind, label, name, metric_type, description, value in metrics:
+            lines += [f"# HELP {prefix}_{name} {description}", f"# TYPE {prefix}_{name} {metric_type}"]
+            lines += [f'{prefix}_{name}{{{label}="{_label(key)}"}} {value(s)}' for key, s in stats[kind].items()]
+
+        # durations are summaries: quantiles, plus the _sum and _count series
+        durations = [("requests", "template", "request_duration_seconds", "Duration of requests"),
+                     ("spans", "span", "span_duration_seconds", "Duration of spans")]
+        for kind, label, name, description in durations:
+            lines += [f"# HELP {prefix}_{name} {description}", f"# TYPE {prefix}_{name} summary"]
+            for key, s in stats[kind].items():
+                labels = f'{label}="{_label(key)}"'
+                lines += [f'{prefix}_{name}{{{labels},quantile="0.5"}} {s["p50"]}',
+                          f'{prefix}_{name}{{{labels},quantile="0.95"}} {s["p95"]}',
+                          f'{prefix}_{name}_sum{{{labels}}} {s["total"]}',
+                          f'{prefix}_{name}_count{{{labels}}} {s["count"]}']
+        return "\n".join(lines) + "\n"
+
+
+# statistics of all requests and spans
+stats = Stats()
+on_request_end(stats.record_request)
+on_span_end(stats.record_span)
@@ -0,0 +1,328 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+"""
+Local mirror of a collection's catalogue: records are harvested once into a SQLite database (with an R-tree index of
+footprints), then browsed locally. Later synchronisations only request records sensed since the last one.
+
+    mirror = MundiCatalogMirror(MundiCatalogue().get_collection("Sentinel2"))
+    mirror.sync("2019-01-01", bbox=(1.3, 43.5, 1.5, 43.7))      # first sync: all records since 2019-01-01
+    mirror.sync(bbox=(1.3, 43.5, 1.5, 43.7))                    # later syncs: only new records
+    records = mirror.browse("2019-03-01", "2019-04-01", bbox=(1.4, 43.6, 1.5, 43.7))
+
+    downloader.browse(mirror=mirror, date_from="2019-03-01", date_to="2019-04-01")
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from os import makedirs
+from os.path import dirname, join
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from lxml import etree
+from mundilib import MUNDI_CACHE_DIR, FootprintIndex, MundiCSW, MundiCollection, MundiException, MundiRecord, \
+    _parse_utc_date, logger, records_to_arrow
+from owslib.csw import CswRecord
+from owslib.util import OrderedDict
+
+# time during which records may still be ingested or updated after their sensing date: it is harvested again at each
+# synchronisation
+DEFAULT_LAG = timedelta(days=2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    identifier TEXT UNIQUE NOT NULL,
+    product_type TEXT,
+    footprint TEXT,
+    sensing_start_date TEXT,
+    sensing_stop_date TEXT,
+    product_datapack_size INTEGER,
+    archive_product_uri TEXT,
+    online_status TEXT,
+    cloud_cover REAL,
+    xml BLOB,
+    harvested_at REAL
+);
+CREATE INDEX IF NOT EXISTS records_sensing_start_date ON records (sensing_start_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS footprints USING rtree (id, min_x, max_x, min_y, max_y);
+CREATE TABLE IF NOT EXISTS syncs (
+    query TEXT PRIMARY KEY,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+# record fields stored as columns
+COLUMNS = list(MundiRecord.FIELDS)
+
+# numbers of a WKT geometry
+WKT_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def _format_date(date: datetime) -> str:
+    # stored dates are UTC, formatted so that they are ordered as strings
+    return None if date is None else date.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_stored_date(text: str) -> datetime:
+    return None if text is None else datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+
+
+def wkt_bounds(wkt: str) -> Tuple[float, float, float, float]:
+    """
+    Bounds of a WKT geometry, without parsing it (coordinates are x y pairs)
+
+    :param wkt: the WKT geometry, eg "POLYGON ((0 1, 2 1, 2 0, 0 0, 0 1))"
+    :return: (x min, y min, x max, y max), or None if the geometry has no coordinates
+    """
+    numbers = [float(n) for n in WKT_NUMBER.findall(wkt or '')]
+    if len(numbers) < 2:
+        return None
+    xs, ys = numbers[0::2], numbers[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class MundiCatalogMirror:
+    """
+    Local mirror of a collection's catalogue records, stored in a SQLite database
+    """
+
+    def __init__(self, collection: MundiCollection, path: str = None):
+        """
+        :param collection: the mirrored collection
+        :param path: path of the SQLite database. Defaults to "mirrors/<collection name>.sqlite" in the mundilib cache
+        folder
+        """
+        self.collection = collection
+        self.path = path or join(MUNDI_CACHE_DIR, 'mirrors', f'{collection.name}.sqlite')
+        if self.path != ':memory:':
+            makedirs(dirname(self.path) or '.', exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._csw = None
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    @property
+    def csw(self) -> MundiCSW:
+        # the live catalogue, only used to synchronise
+        if self._csw is None:
+            self._csw = self.collection.mundi_csw()
+        return self._csw
+
+    # --------------------------
+    # SYNCHRONISATION
+    # --------------------------
+    @staticmethod
+    def _query_key(bbox=None, geometry: str = None, other_fields: Dict[str, Any] = None) -> str:
+        return json.dumps({'bbox': [float(x) for x in bbox] if bbox is not None else None,
+                           'geometry': geometry if bbox is None else None, 'other_fields': other_fields or {}},
+                          sort_keys=True)
+
+    def sync(self, date_from: Union[str, datetime] = None, date_to: Union[str, datetime] = None, bbox=None,
+             geometry: str = None, other_fields: Dict[str, Any] = None, lag: timedelta = DEFAULT_LAG,
+             max_records: int = 1000, max_workers: int = 4) -> int:
+        """
+        Harvest the records matched by a browse request (see MundiDownloader.browse) from the live catalogue. Each
+        request (bbox, geometry and other fields) remembers the dates already harvested: only the dates not harvested
+        yet - and the last "lag" of harvested dates, to get records ingested or updated late - are requested. The dates
+        harvested stay a single range: the dates between those requested and those already harvested are harvested too.
+        Large requests are split in shards (see MundiCSW.get_records_sharded)
+
+        :param date_from: date from which to harvest records. Required by the first synchronisation of a request; then
+        defaults to the dates already harvested
+        :param date_to: date until which to harvest records. Defaults to now
+        :param bbox: a bounding box (longitude min, latitude min, longitude max, latitude max)
+        :param geometry: a WKT geometry. Ignored if bbox is specified
+        :param other_fields: any other CQL filter terms, eg: {"DIAS:productType": "S2MSI1C"}
+        :param lag: time during which records may still be ingested or updated after their sensing date
+        :param max_records: maximum number of records per shard
+        :param max_workers: maximum number of shards requested concurrently
+        :return: the number of records harvested
+        """
+        key = self._query_key(bbox, geometry, other_fields)
+        date_to = _parse_utc_date(date_to) if date_to is not None else datetime.now(timezone.utc)
+        with self._lock:
+            state = self._connection.execute('SELECT date_from, date_to FROM syncs WHERE query = ?', (key,)).fetchone()
+
+        if state is None:
+            if date_from is None:
+                raise MundiException("date_from is required by the first synchronisation of a request")
+            date_from = _parse_utc_date(date_from)
+            ranges = [(date_from, date_to)]
+        else:
+            synced_from, synced_to = (_parse_stored_date(d) for d in state)
+            date_from = _parse_utc_date(date_from) if date_from is not None else synced_from
+            date_from, ranges = min(date_from, synced_from), []
+            # ranges extend up to the dates already harvested, so that no gap is left in between
+            if date_from < synced_from:
+                ranges.append((date_from, synced_from + timedelta(seconds=1)))
+            if date_to > synced_to - lag:
+                ranges.append((max(synced_to - lag, date_from), date_to))
+            date_to = max(date_to, synced_to)
+
+        nb_records = 0
+        for range_from, range_to in ranges:
+            self.csw.get_records_sharded(range_from, range_to, bbox, geometry, other_fields, max_records,
+                                         max_workers)
+            nb_records += self.add_records(self.csw.records.values())
+
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?)',
+                                     (key, _format_date(date_from), _format_date(date_to), time.time()))
+        logger.info(f"{nb_records} records harvested in {len(ranges)} date ranges ({len(self)} records mirrored)")
+        return nb_records
+
+    def add_records(self, csw_records: Iterable[CswRecord]) -> int:
+        """
+        Store records in the mirror (records already stored are replaced)
+
+        :param csw_records: the CswRecord instances
+        :return: the number of records stored
+        """
+        rows, now = [], time.time()
+        for csw_record in csw_records:
+            record = MundiRecord.from_csw_record(csw_record)
+            if record.identifier is None:
+                continue
+            values = [getattr(record, column) for column in COLUMNS]
+            values[COLUMNS.index('sensing_start_date')] = _format_date(record.sensing_start_date)
+            values[COLUMNS.index('sensing_stop_date')] = _format_date(record.sensing_stop_date)
+            rows.append((values, csw_record.xml, wkt_bounds(record.footprint)))
+
+        with self._lock, self._connection:
+            for values, xml, bounds in rows:
+                self._connection.execute(
+                    f'INSERT INTO records ({", ".join(COLUMNS)}, xml, harvested_at) '
+                    f'VALUES ({", ".join("?" * (len(COLUMNS) + 2))}) '
+                    f'ON CONFLICT (identifier) DO UPDATE SET '
+                    f'{", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:] + ["xml", "harvested_at"])}',
+                    (*values, xml, now))
+                record_id = self._connection.execute('SELECT id FROM records WHERE identifier = ?',
+                                                     (values[0],)).fetchone()[0]
+                self._connection.execute('DELETE FROM footprints WHERE id = ?', (record_id,))
+                if bounds is not None:
+                    x_min, y_min, x_max, y_max = bounds
+                    self._connection.execute('INSERT INTO footprints VALUES (?, ?, ?, ?, ?)',
+                                             (record_id, x_min, x_max, y_min, y_max))
+        return len(rows)
+
+    # --------------------------
+    # LOCAL BROWSING
+    # --------------------------
+    def _select(self, columns: str, date_from=None, date_to=None, geometry: str = None, bbox=None,
+                other_fields: Dict[str, Any] = None, online_only: bool = True) -> List[tuple]:
+        conditions, parameters = [], []
+        if online_only:
+            conditions.append("online_status = 'ONLINE'")
+        # dates are exclusive, as in catalogue requests
+        if date_from is not None:
+            conditions.append('sensing_start_date > ?')
+            parameters.append(_format_date(_parse_utc_date(date_from)))
+        if date_to is not None:
+            conditions.append('sensing_start_date < ?')
+            parameters.append(_format_date(_parse_utc_date(date_to)))
+
+        bounds = [float(x) for x in bbox] if bbox is not None else wkt_bounds(geometry) if geometry else None
+        if bounds is not None:
+            conditions.append('id IN (SELECT id FROM footprints WHERE min_x <= ? AND max_x >= ? AND min_y <= ? '
+                              'AND max_y >= ?)')
+            parameters.extend([bounds[2], bounds[0], bounds[3], bounds[1]])
+
+        # other fields are matched against record fields, by element name (eg "DIAS:productType")
+        for field, value in (other_fields or {}).items():
+            column = MundiRecord._ELEMENTS.get(field.split(':')[-1])
+            if column is None:
+                raise MundiException(f"{field} is not mirrored: it can't filter records locally")
+            conditions.append(f'{column} = ?')
+            parameters.append(value)
+
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {columns}, footprint FROM records{where} ORDER BY sensing_start_date, id',
+                parameters).fetchall()
+
+        # bbox is matched against footprints' bounds: geometry is matched exactly (shapely is required)
+        if bbox is None and geometry:
+            from shapely import wkt
+
+            shape = wkt.loads(geometry)
+            rows = [row for row in rows if row[-1] is not None and shape.intersects(wkt.loads(row[-1]))]
+        return [row[:-1] for row in rows]
+
+    def browse(self, date_from: Union[str, datetime] = None, date_to: Union[str, datetime] = None,
+               geometry: str = None, bbox=None, other_fields: Dict[str, Any] = None,
+               online_only: bool = True) -> Dict[str, MundiRecord]:
+        """
+        Browse mirrored records, as MundiDownloader.browse browses the catalogue (parameters are the same). Records are
+        matched against bbox by their footprint's bounds
+
+        :param online_only: if True (default), only online records are matched, as in catalogue requests
+        :return: an OrderedDict of {identifier: MundiRecord}, ordered by sensing date
+        """
+        rows = self._select(', '.join(COLUMNS), date_from, date_to, geometry, bbox, other_fields, online_only)
+        records = OrderedDict()
+        for row in rows:
+            fields = dict(zip(COLUMNS, row))
+            fields['sensing_start_date'] = _parse_stored_date(fields['sensing_start_date'])
+            fields['sensing_stop_date'] = _parse_stored_date(fields['sensing_stop_date'])
+            records[fields['identifier']] = MundiRecord(**fields)
+        return records
+
+    def load_records(self, csw: MundiCSW, **kwargs):
+        """
+        Store mirrored records in a MundiCSW instance, as if they had been got from a GetRecords request (so that they
+        can be downloaded, see MundiDownloader.browse)
+
+        :param csw: the MundiCSW instance
+        :param kwargs: see browse
+        """
+        rows = self._select('identifier, xml', **kwargs)
+        csw.records = OrderedDict((identifier, CswRecord(etree.fromstring(xml))) for identifier, xml in rows)
+        csw.mundi_records = OrderedDict((id_, MundiRecord.from_csw_record(r)) for id_, r in csw.records.items())
+
+    def to_arrow(self, **kwargs):
+        """
+        Get mirrored records as an Arrow table (see records_to_arrow), eg to write them to (Geo)Parquet
+
+        :param kwargs: see browse
+        :return: a pyarrow.Table, one row per record
+        """
+        return records_to_arrow(self.browse(**kwargs).values())
+
+    def footprint_index(self, **kwargs) -> FootprintIndex:
+        """
+        Get a spatial index of the footprints of mirrored records (see FootprintIndex)
+
+        :param kwargs: see browse
+        :return: a FootprintIndex instance
+        """
+        return FootprintIndex(self.browse(**kwargs).values())
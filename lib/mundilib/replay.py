@@ -0,0 +1,443 @@
+#!/usr/bin/python
+# -*- coding: ISO-8859-15 -*-
+# =============================================================================
+# Copyright (c) 2019 Mundi Web Services
+# Licensed under the 3-Clause BSD License; you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# https://opensource.org/licenses/BSD-3-Clause
+#
+# Contact email: patricia.segonds@atos.net
+# =============================================================================
+"""
+Offline record/replay of Mundi web services, to run (and measure) mundilib without hitting live endpoints.
+
+A recording is a folder holding:
+- http/: HTTP exchanges (CSW, OpenSearch, WMS, WCS, WMTS... requests sent with requests, including by owslib)
+- s3/<bucket>/<key>: objects of the object storage
+
+Record some HTTP exchanges, and copy some objects:
+
+    with record("recordings/s2"):
+        MundiCatalogue().get_collection("Sentinel2").mundi_csw().get_records(cql=..., esn="full")
+    Recording("recordings/s2").mirror_s3(s3_client, "s2-l1c", "2019/01/01/")
+
+Replay them, with 50ms of latency per request and 10 MB/s of bandwidth:
+
+    with ReplayServer("recordings/s2", latency=0.05, bandwidth=10 * 1024 ** 2) as server, server.install():
+        MundiCatalogue().get_collection("Sentinel2").mundi_csw().get_records(cql=..., esn="full")
+        MundiDownloader(collection, "key", "secret", endpoint_url=server.url).download(...)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import exists, getmtime, getsize, join, relpath
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+from xml.sax.saxutils import escape
+
+from requests.adapters import HTTPAdapter
+
+from mundilib import logger
+
+# path prefix of the replayed HTTP exchanges on the replay server (other paths are object storage requests)
+REPLAY_PREFIX = "/_replay"
+
+# response headers which are recorded (content is recorded decoded, so that encoding and length are not)
+RECORDED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Cache-Control"]
+
+
+def exchange_key(method: str, url: str, body=None) -> str:
+    """
+    Key of an HTTP exchange in a recording: method, URL (with sorted query parameters) and body of the request
+
+    :return: the key, as a hex digest
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    key = hashlib.sha1(f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{query}".encode("utf-8"))
+    if body:
+        key.update(body)
+    return key.hexdigest()
+
+
+class Recording:
+    """
+    HTTP exchanges and S3 objects stored in a folder (see module documentation)
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.http_folder = join(folder, "http")
+        self.s3_folder = join(folder, "s3")
+        self._lock = threading.Lock()
+        self._index = None
+
+    @property
+    def index(self) -> Dict[str, Dict]:
+        # recorded exchanges, as {key: {"url", "status", "headers", "file"}}
+        if self._index is None:
+            index_path = join(self.http_folder, "index.json")
+            self._index = {}
+            if exists(index_path):
+                with open(index_path) as f:
+                    self._index = json.load(f)
+        return self._index
+
+    def add(self, method: str, url: str, body, status: int, headers, content: bytes):
+        """Record an HTTP exchange (a previous exchange with the same key is replaced)"""
+        key = exchange_key(method, url, body)
+        with self._lock:
+            os.makedirs(self.http_folder, exist_ok=True)
+            with open(join(self.http_folder, f"{key}.body"), "wb") as f:
+                f.write(content)
+            self.index[key] = {"url": url, "method": method.upper(), "status": status, "file": f"{key}.body",
+                               "headers": {name: headers[name] for name in RECORDED_HEADERS if name in headers}}
+            with open(join(self.http_folder, "index.json"), "w") as f:
+                json.dump(self.index, f, indent=1)
+
+    def get(self, method: str, url: str, body=None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Get a recorded HTTP exchange
+
+        :return: a tuple of (status, headers, content), or None if no such exchange has been recorded
+        """
+        exchange = self.index.get(exchange_key(method, url, body))
+        if exchange is None:
+            return None
+        with open(join(self.http_folder, exchange["file"]), "rb") as f:
+            return exchange["status"], exchange["headers"], f.read()
+
+    def mirror_s3(self, s3_client, bucket: str, prefix: str = "") -> int:
+        """
+        Copy objects of the object storage into this recording
+
+        :param s3_client: the boto3 S3 client
+        :param bucket: the bucket of the objects
+        :param prefix: the prefix of the objects
+        :return: the number of objects copied
+        """
+        nb_objects = 0
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                path = join(self.s3_folder, bucket, *obj["Key"].split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                s3_client.download_file(bucket, obj["Key"], path)
+                nb_objects += 1
+        return nb_objects
+
+    def s3_path(self, bucket: str, key: str = "") -> str:
+        return join(self.s3_folder, bucket, *[part for part in key.split("/") if part])
+
+    def list_s3_keys(self, bucket: str) -> List[str]:
+        # all keys of a bucket, sorted
+        root = self.s3_path(bucket)
+        return sorted(relpath(join(folder, filename), root).replace(os.sep, "/")
+                      for folder, _, filenames in os.walk(root) for filename in filenames)
+
+
+@contextmanager
+def _patch_adapter_send(send):
+    # every request sent with requests (shared session, other sessions and owslib) goes through HTTPAdapter.send
+    original_send = HTTPAdapter.send
+    HTTPAdapter.send = lambda adapter, request, **kwargs: send(original_send, adapter, request, **kwargs)
+    try:
+        yield
+    finally:
+        HTTPAdapter.send = original_send
+
+
+@contextmanager
+def record(folder: str):
+    """
+    Record all HTTP exchanges sent with requests (including by owslib) in a recording
+
+    :param folder: the folder of the recording
+    :return: a context manager, yielding the Recording instance
+    """
+    recording = Recording(folder)
+
+    def send(original_send, adapter, request, **kwargs):
+        response = original_send(adapter, request, **kwargs)
+        recording.add(request.method, request.url, request.body, response.status_code, response.headers,
+                      response.content)
+        return response
+
+    with _patch_adapter_send(send):
+        yield recording
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that connections are kept alive (as with live services)
+    protocol_version = "HTTP/1.1"
+    server: _ReplayHTTPServer
+
+    def log_message(self, format, *args):
+        logger.debug(f"Replay server: {format % args}")
+
+    def do_GET(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self, head: bool = False):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.count(requests=1)
+        if self.path.startswith(f"{REPLAY_PREFIX}/"):
+            self._replay_http(body, head)
+        else:
+            self._replay_s3(head)
+
+    def _replay_http(self, body: bytes, head: bool):
+        # /_replay/<scheme>/<netloc>/<path>?<query>
+        scheme, rest = self.path[len(REPLAY_PREFIX) + 1:].split("/", 1)
+        exchange = self.server.recording.get(self.command, f"{scheme}://{rest}", body)
+        if exchange is None:
+            logger.warning(f"Replay server: no recorded exchange for {self.command} {scheme}://{rest}")
+            self._respond(404, {"Content-Type": "text/plain"}, b"No recorded exchange", head)
+        else:
+            self._respond(*exchange, head)
+
+    def _replay_s3(self, head: bool):
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        if key == "":
+            self._list_objects(bucket, dict(parse_qsl(parts.query, keep_blank_values=True)), head)
+            return
+
+        path = self.server.recording.s3_path(bucket, key)
+        if not exists(path):
+            self._respond(404, {"Content-Type": "application/xml"},
+                          f"<Error><Code>NoSuchKey</Code><Key>{escape(key)}</Key></Error>".encode(), head)
+            return
+
+        size, etag = getsize(path), self.server.etag(path)
+        if self.headers.get("If-Match") not in (None, "*", etag):
+            self._respond(412, {"Content-Type": "application/xml"},
+                          b"<Error><Code>PreconditionFailed</Code></Error>", head)
+            return
+
+        headers = {"Content-Type": "application/octet-stream", "ETag": etag, "Accept-Ranges": "bytes",
+                   "Last-Modified": self.date_time_string(getmtime(path))}
+        start, end, status = 0, size - 1, 200
+        byte_range = self.headers.get("Range")
+        if byte_range is not None and byte_range.startswith("bytes="):
+            byte_range = self._parse_range(byte_range[len("bytes="):], size)
+            if byte_range is None:
+                # as S3: the range is out of the object, or invalid
+                self._respond(416, {"Content-Type": "application/xml", "Content-Range": f"bytes */{size}"},
+                              b"<Error><Code>InvalidRange</Code></Error>", head)
+                return
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status = 206
+        with open(path, "rb") as f:
+            f.seek(start)
+            self._respond(status, headers, f.read(end - start + 1), head)
+
+    @staticmethod
+    def _parse_range(byte_range: str, size: int):
+        # (first byte, last byte) of a "first-last", "first-" or "-suffix length" range, None if not satisfiable
+        first, _, last = byte_range.partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+                if last and int(last) < start:
+                    return None
+            else:
+                start, end = max(size - int(last), 0), size - 1
+                if int(last) == 0:
+                    return None
+        except ValueError:
+            return None
+        return (start, end) if start < size else None
+
+    def _list_objects(self, bucket: str, params: Dict[str, str], head: bool):
+        # ListObjectsV2, with prefix, delimiter, max-keys and continuation tokens
+        prefix, delimiter = params.get("prefix", ""), params.get("delimiter")
+        max_keys = int(params.get("max-keys", 1000))
+        start_after = params.get("continuation-token") or params.get("start-after") or ""
+
+        contents, common_prefixes, truncated, last_key = [], [], False, None
+        for key in self.server.recording.list_s3_keys(bucket):
+            if not key.startswith(prefix) or key <= start_after:
+                continue
+            # keys are sorted: the keys of a common prefix are contiguous
+            common_prefix = None
+            if delimiter and delimiter in key[len(prefix):]:
+                common_prefix = key[:len(prefix) + key[len(prefix):].index(delimiter) + len(delimiter)]
+                if common_prefixes and common_prefixes[-1] == common_prefix:
+                    last_key = key
+                    continue
+            if len(contents) + len(common_prefixes) >= max_keys:
+                truncated = True
+                break
+            if common_prefix is not None:
+                common_prefixes.append(common_prefix)
+            else:
+                contents.append(key)
+            last_key = key
+
+        path = self.server.recording.s3_path
+        xml = "".join(f"<Contents><Key>{escape(key)}</Key><Size>{getsize(path(bucket, key))}</Size>"
+                      f"<ETag>{escape(self.server.etag(path(bucket, key)))}</ETag>"
+                      f"<LastModified>{_iso_date(getmtime(path(bucket, key)))}</LastModified>"
+                      f"<StorageClass>STANDARD</StorageClass></Contents>" for key in contents)
+        xml += "".join(f"<CommonPrefixes><Prefix>{escape(p)}</Prefix></CommonPrefixes>" for p in common_prefixes)
+        if truncated:
+            # next page starts after the last key seen
+            xml += f"<NextContinuationToken>{escape(last_key)}</NextContinuationToken>"
+        xml = f"<?xml version='1.0' encoding='UTF-8'?>" \
+              f"<ListBucketResult xmlns='http://s3.amazonaws.com/doc/2006-03-01/'><Name>{escape(bucket)}</Name>" \
+              f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(contents) + len(common_prefixes)}</KeyCount>" \
+              f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{xml}" \
+              f"</ListBucketResult>"
+        self._respond(200, {"Content-Type": "application/xml"}, xml.encode("utf-8"), head)
+
+    def _respond(self, status: int, headers: Dict[str, str], content: bytes, head: bool = False):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if head:
+            return
+
+        # content is sent by chunks, at most bandwidth bytes per second
+        self.server.count(bytes=len(content))
+        chunk_size = 64 * 1024
+        for offset in range(0, len(content), chunk_size):
+            chunk = content[offset:offset + chunk_size]
+            self.wfile.write(chunk)
+            if self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+
+
+def _iso_date(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class _ReplayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recording: Recording, latency: float, bandwidth: float):
+        super().__init__(address, _ReplayHandler)
+        self.recording = recording
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.stats = {"requests": 0, "bytes": 0}
+        self._stats_lock = threading.Lock()
+        # ETags of S3 objects, by path, computed when first requested
+        self._etags = {}
+        self._etags_lock = threading.Lock()
+
+    def count(self, **increments: int):
+        # requests are handled by concurrent threads
+        with self._stats_lock:
+            for name, increment in increments.items():
+                self.stats[name] += increment
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def etag(self, path: str) -> str:
+        # ETag of S3 objects is the MD5 of their content (single part upload)
+        with self._etags_lock:
+            etag = self._etags.get(path)
+        if etag is None:
+            # computed outside of the lock (concurrent requests may compute it twice, with the same result)
+            md5 = hashlib.md5()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 ** 2), b""):
+                    md5.update(chunk)
+            etag = f'"{md5.hexdigest()}"'
+            with self._etags_lock:
+                self._etags[path] = etag
+        return etag
+
+
+class ReplayServer:
+    """
+    Local HTTP server replaying a recording, with a configurable latency and bandwidth. It serves:
+    - the recorded HTTP exchanges, to requests sent with requests once install() has been called
+    - the recorded S3 objects (path-style requests: ListObjectsV2, HeadObject, GetObject with ranges), to S3 clients
+    whose endpoint is the URL of the server
+    """
+
+    def __init__(self, folder: str, latency: float = 0., bandwidth: float = None, host: str = "127.0.0.1",
+                 port: int = 0):
+        """
+        :param folder: the folder of the recording
+        :param latency: time (in seconds) waited before responding to each request
+        :param bandwidth: maximum number of bytes per second sent for each response. If None, no limit
+        :param host: the host to listen on
+        :param port: the port to listen on. If 0, a free port is used
+        """
+        self.recording = Recording(folder)
+        self._server = _ReplayHTTPServer((host, port), self.recording, latency, bandwidth)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of requests served, and number of bytes sent"""
+        return self._server.stats_snapshot()
+
+    def start(self) -> ReplayServer:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mundilib-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> ReplayServer:
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def replay_url(self, url: str) -> str:
+        """Get the URL on this server of a recorded URL"""
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self.url}{REPLAY_PREFIX}/{parts.scheme}/{parts.netloc}{parts.path}{query}"
+
+    @contextmanager
+    def install(self):
+        """
+        Send all requests sent with requests (shared session, other sessions and owslib) to this server
+
+        :return: a context manager
+        """
+        def send(original_send, adapter, request, **kwargs):
+            if not request.url.startswith(self.url):
+                request = request.copy()
+                request.url = self.replay_url(request.url)
+            return original_send(adapter, request, **kwargs)
+
+        with _patch_adapter_send(send):
+            yield self